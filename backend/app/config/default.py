@@ -19,6 +19,8 @@ class DefaultSettings(BaseSettings):
     VUE_APP_DNS_URL: str
 
     API_KEY: str
+    AI_URL: str = "https://api.openai.com/v1/chat/completions"
+    AI_MODEL: str = "gpt-4.1-mini"
 
     SECRET_KEY: str
     ALGORITHM: str
@@ -33,6 +35,100 @@ class DefaultSettings(BaseSettings):
 
     CRYPTO_API_KEY: str 
 
+    QUIZ_CACHE_MAX_POOLS: int = 256
+    QUIZ_CACHE_MAX_POOL_QUESTIONS: int = 5000
+    QUIZ_CACHE_TTL_SECONDS: int = 300
+
+    AI_HTTP_MAX_CONNECTIONS: int = 100
+    AI_HTTP_MAX_CONNECTIONS_PER_HOST: int = 32
+    AI_HTTP_DNS_CACHE_SECONDS: int = 300
+    AI_HTTP_KEEPALIVE_SECONDS: float = 30
+    AI_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    AI_HTTP_READ_TIMEOUT_SECONDS: float = 60
+    AI_HTTP_TOTAL_TIMEOUT_SECONDS: float = 180
+
+    AI_REQUEST_BUDGET_SECONDS: float = 120
+    AI_RETRY_ATTEMPTS: int = 3
+    AI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    AI_RETRY_MAX_DELAY_SECONDS: float = 8
+    AI_BREAKER_WINDOW_SECONDS: float = 30
+    AI_BREAKER_MIN_REQUESTS: int = 10
+    AI_BREAKER_FAILURE_RATE: float = 0.5
+    AI_BREAKER_OPEN_SECONDS: float = 30
+    AI_HEDGE_ENABLED: bool = False
+    AI_HEDGE_PERCENTILE: float = 0.95
+    AI_HEDGE_MIN_SAMPLES: int = 20
+    AI_HEDGE_DELAY_SECONDS: float = 2
+    AI_HEDGE_MIN_DELAY_SECONDS: float = 0.2
+    AI_HEDGE_URL: str = ""
+    AI_HEDGE_API_KEY: str = ""
+    AI_HEDGE_MODEL: str = ""
+
+    AI_RATE_LIMIT_ENABLED: bool = True
+    AI_RATE_LIMIT_SHARED: bool = True
+    AI_RATE_LIMIT_SHARED_BATCH: int = 10
+    AI_RATE_LIMIT_SHARED_RESERVE_SECONDS: float = 1
+    AI_RATE_LIMIT_RPM: float = 500
+    AI_RATE_LIMIT_TPM: float = 200000
+    AI_RATE_LIMIT_MIN_CONCURRENCY: int = 1
+    AI_RATE_LIMIT_MAX_CONCURRENCY: int = 32
+    AI_RATE_EXPECTED_OUTPUT_TOKENS: int = 400
+
+    AI_QUOTA_ENABLED: bool = True
+    AI_QUOTA_WINDOW_SECONDS: int = 24 * 60 * 60
+    AI_QUOTA_REQUESTS: int = 500
+    AI_QUOTA_TOKENS: int = 500000
+    AI_USAGE_BUCKET_SECONDS: int = 60 * 60
+    AI_USAGE_FLUSH_INTERVAL_SECONDS: float = 5
+    ADMIN_EMAILS: list[str] = []
+
+    AI_GENERATION_STREAM: bool = True
+    AI_GENERATION_TIMEOUT_SECONDS: float = 10
+    AI_GENERATION_CHUNK_SIZE: int = 5
+
+    AI_FEEDBACK_PROMPT_TOKEN_BUDGET: int = 2000
+    AI_FEEDBACK_QUESTION_MAX_CHARS: int = 200
+
+    AI_STRUCTURED_OUTPUT: bool = True
+    AI_STRUCTURED_RETRIES: int = 1
+
+    AI_POOL_ENABLED: bool = True
+    AI_POOL_LOW_WATER: int = 15
+    AI_POOL_TARGET: int = 45
+    AI_POOL_BATCH: int = 15
+    AI_POOL_REFILL_INTERVAL_SECONDS: int = 60
+    AI_POOL_LEASE_SECONDS: int = 300
+    AI_POOL_MAX_CONCURRENT_REFILLS: int = 2
+
+    QUIZ_SNAPSHOT_TTL_SECONDS: int = 6 * 60 * 60
+    QUIZ_SNAPSHOT_CLEANUP_INTERVAL_SECONDS: int = 10 * 60
+
+    AI_GRADING_CONCURRENCY: int = 8
+    AI_GRADING_BATCH_SIZE: int = 5
+    AI_GRADING_MODE: str = "full"  # full | fast
+    AI_GRADING_MAX_TOKENS: int = 200
+    AI_GRADING_FEEDBACK_MAX_CHARS: int = 300
+    AI_QUIZ_SCORE_ONLY: bool = False
+
+    PREGRADE_ENABLED: bool = True
+    # Короткие верные ответы ("42", "да", "O(1)") не должны получать 0 без модели
+    PREGRADE_MIN_LENGTH: int = 1
+    PREGRADE_COPY_THRESHOLD: float = 0.85
+    PREGRADE_SHINGLE_SIZE: int = 4
+
+    GRADING_CACHE_ENABLED: bool = True
+    GRADING_CACHE_MEMORY_SIZE: int = 10000
+    GRADING_CACHE_TTL_SECONDS: int = 30 * 24 * 60 * 60
+    GRADING_CACHE_CLEANUP_INTERVAL_SECONDS: int = 60 * 60
+
+    QUIZ_JOB_TTL_SECONDS: int = 24 * 60 * 60
+    QUIZ_JOB_POLL_INTERVAL_SECONDS: float = 0.5
+    QUIZ_JOB_FLUSH_INTERVAL_SECONDS: float = 0.25
+    QUIZ_JOB_HEARTBEAT_SECONDS: float = 10
+    QUIZ_JOB_STALE_SECONDS: float = 60
+    QUIZ_JOB_STREAM_MAX_SECONDS: float = 10 * 60
+    QUIZ_JOB_CLEANUP_INTERVAL_SECONDS: int = 60 * 60
+
     PWD_CONTEXT: CryptContext = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
     model_config = SettingsConfigDict(env_file="../.env", extra='ignore') 
@@ -0,0 +1,33 @@
+"""Add random_key to questions
+
+Revision ID: 4b7e2c91d0a5
+Revises: 10fa7cdddd13
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e2c91d0a5'
+down_revision: Union[str, None] = '10fa7cdddd13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # server_default заполняет random_key и для уже существующих строк
+    op.add_column('AIQuestion', sa.Column('random_key', sa.Float(), server_default=sa.text('random()'), nullable=False))
+    op.create_index('ix__AIQuestion__topic_id_random_key', 'AIQuestion', ['topic_id', 'random_key'], unique=False)
+    op.add_column('Question', sa.Column('random_key', sa.Float(), server_default=sa.text('random()'), nullable=False))
+    op.create_index('ix__Question__topic_id_random_key', 'Question', ['topic_id', 'random_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix__Question__topic_id_random_key', table_name='Question')
+    op.drop_column('Question', 'random_key')
+    op.drop_index('ix__AIQuestion__topic_id_random_key', table_name='AIQuestion')
+    op.drop_column('AIQuestion', 'random_key')
@@ -1,8 +1,9 @@
-from .session import get_session, refresh_engine, get_sync_session
+from .session import get_session, refresh_engine, get_sync_session, session_scope
 
 
 __all__ = [
     "get_session",
     "refresh_engine",
-    "get_sync_session"
+    "get_sync_session",
+    "session_scope",
 ]
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -28,6 +29,9 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+# Сессия вне Depends: для фоновых задач и параллельных запросов
+session_scope = asynccontextmanager(get_session)
+
 def refresh_engine() -> None:
     global engine, async_session_maker
     engine = create_async_engine(
@@ -1,6 +1,7 @@
 from .user import User
 from .settings import Settings
-from .question import Question, AIQuestion, Answer
+from .question import Question, AIQuestion, Answer, GeneratedQuestion, GenerationLease, \
+    QuizSnapshot, GradingCacheEntry, QuizJob, AIRateLimitState, AIUsage
 from .topic import Topic, Chapter
 
 table_models = [
@@ -9,6 +10,13 @@ table_models = [
     Question,
     AIQuestion,
     Answer,
+    GeneratedQuestion,
+    GenerationLease,
+    QuizSnapshot,
+    GradingCacheEntry,
+    QuizJob,
+    AIRateLimitState,
+    AIUsage,
     Topic,
     Chapter,
 ]
@@ -19,6 +27,13 @@ __all__ = [
     "Question",
     "AIQuestion",
     "Answer",
+    "GeneratedQuestion",
+    "GenerationLease",
+    "QuizSnapshot",
+    "GradingCacheEntry",
+    "QuizJob",
+    "AIRateLimitState",
+    "AIUsage",
     "Topic",
     "Chapter",
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, UUID, ForeignKey, Integer
+from sqlalchemy import Column, String, Boolean, UUID, ForeignKey, Integer, Float, Index, DateTime, JSON, func
 from app.database import DeclarativeBase
 import uuid
 from sqlalchemy.orm import validates, relationship
@@ -6,6 +6,9 @@ from sqlalchemy.orm import validates, relationship
 
 class Question(DeclarativeBase):
     __tablename__ = "Question"
+    __table_args__ = (
+        Index("ix__Question__topic_id_random_key", "topic_id", "random_key"),
+    )
 
     id = Column(
         UUID(as_uuid=True),
@@ -22,6 +25,8 @@ class Question(DeclarativeBase):
     picture = Column(String)
     topic_id = Column(UUID, ForeignKey("Topic.id"), index=True)
     topic = relationship("Topic")
+    # Случайный ключ для выборки вопросов в квиз без ORDER BY random()
+    random_key = Column(Float, nullable=False, server_default=func.random())
 
     answers = relationship(
         "Answer",
@@ -33,6 +38,9 @@ class Question(DeclarativeBase):
 
 class AIQuestion(DeclarativeBase):
     __tablename__ = "AIQuestion"
+    __table_args__ = (
+        Index("ix__AIQuestion__topic_id_random_key", "topic_id", "random_key"),
+    )
 
     id = Column(
         UUID(as_uuid=True),
@@ -48,6 +56,7 @@ class AIQuestion(DeclarativeBase):
     picture = Column(String)
     topic_id = Column(UUID, ForeignKey("Topic.id"), index=True)
     topic = relationship("Topic")
+    random_key = Column(Float, nullable=False, server_default=func.random())
 
 
 class Answer(DeclarativeBase):
@@ -64,3 +73,116 @@ class Answer(DeclarativeBase):
     question_id = Column(UUID, ForeignKey("Question.id"), index=True)
     question = relationship("Question")
     is_correct = Column(Boolean)
+
+
+class GeneratedQuestion(DeclarativeBase):
+    """
+    Заранее сгенерированный открытый вопрос, ожидающий выдачи в квиз.
+    Принадлежит либо теме (topic_id), либо разделу (chapter_id).
+    """
+    __tablename__ = "GeneratedQuestion"
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        unique=True
+    )
+
+    topic_id = Column(UUID, ForeignKey("Topic.id"), index=True)
+    chapter_id = Column(UUID, ForeignKey("Chapter.id"), index=True)
+    description = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class GenerationLease(DeclarativeBase):
+    """
+    Аренда пополнения буфера сгенерированных вопросов: пока expires_at не
+    наступил, буфер key пополняет только один воркер.
+    """
+    __tablename__ = "GenerationLease"
+
+    key = Column(String(128), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class QuizSnapshot(DeclarativeBase):
+    """
+    Выданный пользователю квиз: вопросы, правильные ответы и промпты
+    сгенерированных вопросов. Живет до expires_at.
+    """
+    __tablename__ = "QuizSnapshot"
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        unique=True
+    )
+
+    payload = Column(JSON, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class GradingCacheEntry(DeclarativeBase):
+    """
+    Результат проверки открытого ответа моделью.
+    key - sha256 от нормализованных текста вопроса и ответа.
+    """
+    __tablename__ = "GradingCache"
+
+    key = Column(String(64), primary_key=True)
+    score = Column(Integer, nullable=False)
+    feedback = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class QuizJob(DeclarativeBase):
+    """
+    Асинхронная проверка квиза. events - события в порядке появления:
+    ответы с выбором, затем каждый открытый ответ, затем рекомендации.
+    """
+    __tablename__ = "QuizJob"
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        unique=True
+    )
+
+    user_id = Column(UUID, ForeignKey("Users.id"), index=True)
+    status = Column(String, nullable=False)     # running, done, failed
+    events = Column(JSON, nullable=False)
+    result = Column(JSON)
+    error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class AIRateLimitState(DeclarativeBase):
+    """
+    Общий для всех воркеров token bucket запросов к модели.
+    requests/tokens - остаток на момент updated_at, blocked_until - пауза после 429.
+    """
+    __tablename__ = "AIRateLimit"
+
+    name = Column(String(64), primary_key=True)
+    requests = Column(Float, nullable=False)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    blocked_until = Column(DateTime(timezone=True), nullable=True)
+
+
+class AIUsage(DeclarativeBase):
+    """
+    Запросы и токены модели пользователя за корзину времени длиной
+    AI_USAGE_BUCKET_SECONDS, начиная с bucket_start.
+    """
+    __tablename__ = "AIUsage"
+
+    user_id = Column(UUID, ForeignKey("Users.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True, index=True)
+    requests = Column(Integer, nullable=False, default=0)
+    tokens = Column(Integer, nullable=False, default=0)
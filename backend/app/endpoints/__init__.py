@@ -7,6 +7,7 @@ from .upload import api_router as upload_router
 from .question import api_router as question_router
 from .topic import api_router as topic_router
 from .docs import api_router as docs_router
+from .metrics import api_router as metrics_router
 
 
 list_of_routes = [
@@ -19,6 +20,7 @@ list_of_routes = [
     question_router,
     topic_router,
     docs_router,
+    metrics_router,
 ]
 
 __all__ = [
@@ -4,11 +4,26 @@ from flask_admin.contrib.sqla import ModelView
 
 from app.database import DeclarativeBase
 from app.database.connection import get_sync_session
+from app.utils.question_cache import question_pool_cache
 
 
 flask_app = Flask(__name__)
 flask_app.secret_key = 'secret'
 
+
+class CachedModelView(ModelView):
+    """
+    Правки в админке (в том числе удаление тем и вопросов) сбрасывают
+    кэш пулов вопросов воркера.
+    """
+
+    def after_model_change(self, form, model, is_created):
+        question_pool_cache.clear()
+
+    def after_model_delete(self, model):
+        question_pool_cache.clear()
+
+
 admin = Admin(flask_app, name='Admin panel')
 table_models = [mapper.class_ for mapper in DeclarativeBase.registry.mappers]
-admin.add_views(*(ModelView(m, next(get_sync_session())) for m in table_models))
+admin.add_views(*(CachedModelView(m, next(get_sync_session())) for m in table_models))
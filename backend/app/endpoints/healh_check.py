@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from starlette import status
 
+from app.utils.ai_client import breaker
+
 
 api_router = APIRouter(tags=["Health check"])
 
@@ -10,4 +12,9 @@ api_router = APIRouter(tags=["Health check"])
     status_code=status.HTTP_200_OK,
 )
 async def health_check():
-    return {"status": "ok"}
+    # Сервис отвечает и при открытом breaker, но проверка ответов моделью недоступна
+    ai = breaker.stats()
+    return {
+        "status": "ok" if ai["state"] == "closed" else "degraded",
+        "ai_circuit": ai,
+    }
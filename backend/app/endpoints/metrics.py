@@ -0,0 +1,97 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from starlette import status
+
+from app.utils.ai_client import hedger
+from app.utils.ai_generation import generation_stats
+from app.utils.ai_metrics import ai_call_stats
+from app.utils.ai_usage import usage_tracker
+from app.utils.grading_cache import grading_cache
+from app.utils.pregrader import pregrader
+from app.utils.rate_limiter import rate_limiter
+from app.utils.question_cache import question_pool_cache
+from app.utils.user import get_admin_user, User
+
+
+api_router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"]
+)
+
+
+@api_router.get(
+    "/cache",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_403_FORBIDDEN: {"description": "Admins only"}
+    },
+)
+async def cache_metrics(admin: Annotated[User, Depends(get_admin_user)]):
+    """
+    Счетчики кэшей текущего воркера.
+    """
+    return {
+        "question_pool": question_pool_cache.stats(),
+        "grading": grading_cache.stats(),
+    }
+
+
+@api_router.get(
+    "/grading",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_403_FORBIDDEN: {"description": "Admins only"}
+    },
+)
+async def grading_metrics(admin: Annotated[User, Depends(get_admin_user)]):
+    """
+    Сколько открытых ответов оценено локально, без запроса к модели.
+    """
+    return {
+        "pregrader": pregrader.stats(),
+    }
+
+
+@api_router.get(
+    "/ai",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_403_FORBIDDEN: {"description": "Admins only"}
+    },
+)
+async def ai_metrics(admin: Annotated[User, Depends(get_admin_user)]):
+    """
+    Вызовы модели по операциям (check, check_batch, check_scores, generate,
+    feedback): задержки, статусы, токены и ошибки разбора. generation - сколько
+    запросов генерации ушло к модели и сколько слито с уже идущими.
+    hedging - сколько запросов продублировано и чей ответ пришел первым.
+    rate_limiter - лимит одновременных запросов, ожидание в бакете RPM/TPM.
+    """
+    return {
+        "calls": ai_call_stats(),
+        "generation": dict(generation_stats),
+        "hedging": hedger.stats(),
+        "rate_limiter": rate_limiter.stats(),
+    }
+
+
+@api_router.get(
+    "/ai_usage",
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_403_FORBIDDEN: {"description": "Admins only"}
+    },
+)
+async def ai_usage_metrics(
+    admin: Annotated[User, Depends(get_admin_user)],
+    limit: int = Query(20, gt=0, le=200),
+):
+    """
+    Пользователи с наибольшим расходом запросов и токенов модели за окно
+    квоты; *_share - доля от квоты. Только для ADMIN_EMAILS.
+    """
+    return {
+        "quota": usage_tracker.stats(),
+        "users": await usage_tracker.top_users(limit),
+    }
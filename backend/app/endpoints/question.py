@@ -1,17 +1,20 @@
 from app.schemas.question import QuizResult
 from fastapi import APIRouter, Depends, status, HTTPException, Body, Query, Path
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated, Optional
 from uuid import UUID
 
 
-from app.utils.user import get_current_user, User
+from app.utils.user import get_current_user, get_optional_user, User
+from app.utils.ai_usage import enforce_ai_quota
 from app.database.connection import get_session
 from app.schemas import QuestionCreateForm, QuestionResponse, \
     AnswerCreateForm, AnswerResponse, \
     UserAnswerForm, CorrectAnswers, QuestionUpdateForm, \
     AnswerUpdateForm, QuizResponse, AIQuestionCreateForm, \
-    QuizSubmission, AIQuestionResponse, UserAIAnswerForm
+    QuizSubmission, AIQuestionResponse, UserAIAnswerForm, \
+    QuizJobCreated, QuizJobStatus
 from app.config import get_settings, DefaultSettings
 from app.utils.ai_generation import check_ai_question_utils
 from app.utils.question import (
@@ -29,7 +32,10 @@ from app.utils.question import (
     submit_quiz_utils,
     get_all_ai_questions,
     get_question_count_utils,
+    prepare_submission,
 )
+from app.utils.quiz_jobs import create_quiz_job, get_quiz_job, stream_quiz_job, \
+    stream_submission
 
 
 api_router = APIRouter(
@@ -229,14 +235,25 @@ async def delete_answer(current_user: Annotated[User, Depends(get_current_user)]
             responses={
                      status.HTTP_401_UNAUTHORIZED: {
                          "descriprion": "Non authorized"
-                     }
+                     },
+                     status.HTTP_429_TOO_MANY_REQUESTS: {
+                         "description": "AI quota exceeded"
+                     },
                  })
 async def get_quiz(session: Annotated[AsyncSession, Depends(get_session)],
+                   current_user: Annotated[Optional[User], Depends(get_optional_user)],
                    count: int = Query(..., alias="n", gt=-1, le=100),
                    ai_count: int = Query(..., alias="k", gt=-1, le=100),
                    gen_count: int = Query(..., alias="m", gt=-1, le=15),
                    topic_id: Optional[UUID] = Query(None, description="ID темы (Topic)"),
                    chapter_id: Optional[UUID] = Query(None, description="ID раздела (Chapter)"),) -> QuizResponse:
+    if gen_count > 0:
+        # Генерация вопросов идет в квоту пользователя, анонимно недоступна
+        if current_user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="Not authenticated",
+                                headers={"WWW-Authenticate": "Bearer"})
+        await enforce_ai_quota(current_user)
     return await get_quiz_utils(session, count, ai_count, gen_count, topic_id, chapter_id)
 
 
@@ -246,28 +263,145 @@ async def get_quiz(session: Annotated[AsyncSession, Depends(get_session)],
     responses={
         status.HTTP_401_UNAUTHORIZED: {
             "descriprion": "Non authorized"
-        }
+        },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "description": "AI quota exceeded"
+        },
     }
 )
 async def submit_quiz(
     submission: QuizSubmission,
-    _: Annotated[User, Depends(get_current_user)],
+    current_user: Annotated[User, Depends(get_current_user)],
     session: Annotated[AsyncSession, Depends(get_session)]
 ) -> QuizResult:
+    await enforce_ai_quota(current_user)
     return await submit_quiz_utils(submission, session)
 
 
+@api_router.post(
+    '/quiz/submit_stream',
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "descriprion": "Non authorized"
+        },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "description": "AI quota exceeded"
+        },
+    }
+)
+async def submit_quiz_stream(
+    submission: QuizSubmission,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[AsyncSession, Depends(get_session)]
+) -> StreamingResponse:
+    await enforce_ai_quota(current_user)
+    prepared = await prepare_submission(submission, session)
+    return StreamingResponse(
+        stream_submission(prepared),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.post(
+    '/quiz/submit_async',
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "descriprion": "Non authorized"
+        },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "description": "AI quota exceeded"
+        },
+    }
+)
+async def submit_quiz_async(
+    submission: QuizSubmission,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[AsyncSession, Depends(get_session)]
+) -> QuizJobCreated:
+    await enforce_ai_quota(current_user)
+    prepared = await prepare_submission(submission, session)
+    job_id = await create_quiz_job(session, current_user.id, prepared)
+    return QuizJobCreated(job_id=job_id)
+
+
+@api_router.get(
+    '/quiz/jobs/{job_id}',
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "descriprion": "Non authorized"
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "description": "Job not found"
+        },
+    }
+)
+async def get_quiz_job_status(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    job_id: UUID = Path(..., description="ID задачи проверки квиза")
+) -> QuizJobStatus:
+    job = await get_quiz_job(session, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Задача не найдена")
+    return QuizJobStatus(
+        job_id=job.id,
+        status=job.status,
+        events=job.events,
+        result=job.result,
+        error=job.error,
+    )
+
+
+@api_router.get(
+    '/quiz/jobs/{job_id}/stream',
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "descriprion": "Non authorized"
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "description": "Job not found"
+        },
+    }
+)
+async def stream_quiz_job_events(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    job_id: UUID = Path(..., description="ID задачи проверки квиза")
+) -> StreamingResponse:
+    if await get_quiz_job(session, job_id, current_user.id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Задача не найдена")
+    return StreamingResponse(
+        stream_quiz_job(job_id, current_user.id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: иначе nginx копит события в буфере
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @api_router.post('/check_ai_question',
             status_code=status.HTTP_200_OK,
             responses={
                      status.HTTP_401_UNAUTHORIZED: {
                          "descriprion": "Non authorized"
-                     }
+                     },
+                     status.HTTP_429_TOO_MANY_REQUESTS: {
+                         "description": "AI quota exceeded"
+                     },
                  })
 async def check_ai_question(response: UserAIAnswerForm,
                             current_user: Annotated[User, Depends(get_current_user)],
                             session: Annotated[AsyncSession, Depends(get_session)],
                             settings: Annotated[DefaultSettings, Depends(get_settings)]):
+    await enforce_ai_quota(current_user)
     return await check_ai_question_utils(response.question_id, response.text, session)
 
 
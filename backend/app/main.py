@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from logging import getLogger
 from fastapi import FastAPI
 from uvicorn import run
@@ -7,6 +9,11 @@ from app.endpoints.admin import flask_app
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.wsgi import WSGIMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from app.utils.generation_pool import run_generation_producer
+from app.utils.cleanup import run_expiry_cleanup
+from app.database.models import QuizSnapshot, GradingCacheEntry, QuizJob
+from app.utils.ai_client import start_ai_client, close_ai_client
+from app.utils.ai_usage import run_usage_flush, usage_tracker
 
 
 
@@ -18,6 +25,30 @@ def bindRoutes(application: FastAPI, setting: DefaultSettings) -> None:
        application.include_router(route, prefix=setting.PATH_PREFIX)
 
 
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    await start_ai_client()
+    settings = get_settings()
+    background = [
+        asyncio.create_task(run_generation_producer()),
+        asyncio.create_task(run_expiry_cleanup(
+            QuizSnapshot, settings.QUIZ_SNAPSHOT_CLEANUP_INTERVAL_SECONDS)),
+        asyncio.create_task(run_expiry_cleanup(
+            QuizJob, settings.QUIZ_JOB_CLEANUP_INTERVAL_SECONDS)),
+        asyncio.create_task(run_usage_flush()),
+    ]
+    if settings.GRADING_CACHE_ENABLED:
+        background.append(asyncio.create_task(run_expiry_cleanup(
+            GradingCacheEntry, settings.GRADING_CACHE_CLEANUP_INTERVAL_SECONDS)))
+    yield
+    for task in background:
+        task.cancel()
+    with suppress(asyncio.CancelledError):
+        await asyncio.gather(*background)
+    await usage_tracker.flush()
+    await close_ai_client()
+
+
 def getApp() -> FastAPI:
     description = "Микросервис для создания расписания."
 
@@ -27,6 +58,7 @@ def getApp() -> FastAPI:
         version="1.0.0",
         title="Chrono",
         description=description,
+        lifespan=lifespan,
     )
 
     settings = get_settings()
@@ -2,4 +2,5 @@ from .token import *
 from .user import *
 from .registration import *
 from .question import *
-from .topic import *
\ No newline at end of file
+from .topic import *
+from .ai import *
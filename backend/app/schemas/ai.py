@@ -0,0 +1,57 @@
+from pydantic import BaseModel, ConfigDict, Field
+
+
+#  ------------------LLM Responses----------------------
+class AICheckResult(BaseModel):
+    """
+    Оценка одного открытого ответа моделью
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    score: int = Field(ge=0, le=2)
+    feedback: str
+
+
+class AICheckBatchResult(BaseModel):
+    """
+    Оценки нескольких открытых ответов в порядке вопросов
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    results: list[AICheckResult]
+
+
+class AIScoreResult(BaseModel):
+    """
+    Оценка открытого ответа без фидбэка
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    score: int = Field(ge=0, le=2)
+
+
+class AIScoreBatchResult(BaseModel):
+    """
+    Оценки без фидбэка в порядке вопросов
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    results: list[AIScoreResult]
+
+
+class AIGeneratedQuestion(BaseModel):
+    """
+    Вопрос, сгенерированный моделью
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    description: str = Field(min_length=1)
+
+
+class AIGeneratedQuestions(BaseModel):
+    """
+    Ответ модели на запрос генерации вопросов
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    questions: list[AIGeneratedQuestion]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict, computed_field
 from uuid import UUID
-from typing import List, Optional
+from typing import Any, List, Optional
 
 
 #  -------------Creating------------------
@@ -152,6 +152,7 @@ class QuizResponse(BaseModel):
     questions: List[QuestionQuizResponse]
     ai_questions: List[AIQuestionQuizResponse]
     gen_question: List[str]
+    quiz_id: UUID | None = None
 
 
 class QuizSubmission(BaseModel):
@@ -161,6 +162,7 @@ class QuizSubmission(BaseModel):
     answers: List[UserAnswerForm]
     ai_answers: List[UserAIAnswerForm]
     gen_answers: List[UserGenAnswerForm]
+    quiz_id: UUID | None = None
 
 
 class QuestionResult(BaseModel):
@@ -194,3 +196,30 @@ class QuizResult(BaseModel):
     @property
     def total_correct_answers(self) -> int:
         return sum(ans.is_user_right for ans in self.answers)
+
+
+#  ------------------Quiz Jobs----------------------
+class QuizJobCreated(BaseModel):
+    """
+    Квиз принят на асинхронную проверку
+    """
+    job_id: UUID
+
+
+class QuizJobEvent(BaseModel):
+    """
+    Событие проверки: answers, open_answer или recommendations
+    """
+    type: str
+    data: dict[str, Any]
+
+
+class QuizJobStatus(BaseModel):
+    """
+    Состояние асинхронной проверки квиза
+    """
+    job_id: UUID
+    status: str
+    events: list[QuizJobEvent]
+    result: QuizResult | None = None
+    error: str | None = None
@@ -0,0 +1,349 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiohttp
+
+from app.config import get_settings
+from app.utils.rate_limiter import estimate_tokens, rate_limiter
+
+
+settings = get_settings()
+
+_client: aiohttp.ClientSession | None = None
+
+
+def _create_client() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.AI_HTTP_MAX_CONNECTIONS,
+        limit_per_host=settings.AI_HTTP_MAX_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=settings.AI_HTTP_DNS_CACHE_SECONDS,
+        keepalive_timeout=settings.AI_HTTP_KEEPALIVE_SECONDS,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.AI_HTTP_TOTAL_TIMEOUT_SECONDS,
+        connect=settings.AI_HTTP_CONNECT_TIMEOUT_SECONDS,
+        sock_read=settings.AI_HTTP_READ_TIMEOUT_SECONDS,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def get_ai_client() -> aiohttp.ClientSession:
+    """
+    Общий HTTP-клиент для запросов к модели: соединения с провайдером
+    переиспользуются между запросами. Вне lifespan (скрипты) создается лениво.
+    """
+    global _client
+    if _client is None or _client.closed:
+        _client = _create_client()
+    return _client
+
+
+async def start_ai_client() -> None:
+    get_ai_client()
+
+
+async def close_ai_client() -> None:
+    global _client
+    if _client is not None and not _client.closed:
+        await _client.close()
+    _client = None
+
+
+class AIUnavailableError(Exception):
+    """
+    Запрос к модели не выполнен: открыт circuit breaker или исчерпан бюджет времени.
+    """
+
+
+# Ошибки, после которых вызывающий код отдает check_error вместо ответа модели
+AI_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, AIUnavailableError)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitBreaker:
+    """
+    Открывается, если за window секунд было не меньше min_requests запросов
+    и доля ошибок не ниже failure_rate. В открытом состоянии запросы сразу
+    отклоняются; через open_seconds пропускается один пробный запрос.
+    """
+
+    def __init__(self, window: float, min_requests: int, failure_rate: float,
+                 open_seconds: float):
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        # Зависший пробный запрос не должен держать breaker открытым вечно
+        now = time.monotonic()
+        if state == "half_open" and (self._probe_started is None or
+                                     now - self._probe_started > self.open_seconds):
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        if self._opened_at is not None:
+            # Результат пробного запроса закрывает или заново открывает breaker
+            if self._probe_started is None:
+                return
+            self._probe_started = None
+            self._opened_at = None if ok else now
+            self._outcomes.clear()
+            return
+
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if len(self._outcomes) >= self.min_requests and \
+                failures / len(self._outcomes) >= self.failure_rate:
+            self._opened_at = now
+            self.opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "window_requests": len(self._outcomes),
+            "window_failures": sum(1 for _, success in self._outcomes if not success),
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+breaker = CircuitBreaker(
+    window=settings.AI_BREAKER_WINDOW_SECONDS,
+    min_requests=settings.AI_BREAKER_MIN_REQUESTS,
+    failure_rate=settings.AI_BREAKER_FAILURE_RATE,
+    open_seconds=settings.AI_BREAKER_OPEN_SECONDS,
+)
+
+
+class Hedger:
+    """
+    Решает, когда отправлять дубль медленного запроса: через percentile
+    от последних samples задержек ответа основного адреса. Пока замеров
+    меньше min_samples, ждет default_delay.
+    """
+
+    def __init__(self, percentile: float, min_samples: int, default_delay: float,
+                 min_delay: float, samples: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._latencies: deque[float] = deque(maxlen=samples)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    def observe(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self._latencies)
+        idx = min(int(self.percentile * len(ordered)), len(ordered) - 1)
+        return max(ordered[idx], self.min_delay)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "delay_seconds": round(self.delay(), 3),
+        }
+
+
+hedger = Hedger(
+    percentile=settings.AI_HEDGE_PERCENTILE,
+    min_samples=settings.AI_HEDGE_MIN_SAMPLES,
+    default_delay=settings.AI_HEDGE_DELAY_SECONDS,
+    min_delay=settings.AI_HEDGE_MIN_DELAY_SECONDS,
+)
+
+
+def _hedge_target(url: str, payload: dict, headers: dict) -> tuple[str, dict, dict]:
+    """
+    Куда уходит дубль: на AI_HEDGE_URL, если он задан, иначе туда же.
+    """
+    if not settings.AI_HEDGE_URL:
+        return url, payload, headers
+    if settings.AI_HEDGE_MODEL:
+        payload = {**payload, "model": settings.AI_HEDGE_MODEL}
+    if settings.AI_HEDGE_API_KEY:
+        headers = {**headers, "Authorization": f"Bearer {settings.AI_HEDGE_API_KEY}"}
+    return settings.AI_HEDGE_URL, payload, headers
+
+
+async def _send(url: str, payload: dict, headers: dict,
+                deadline: float) -> aiohttp.ClientResponse:
+    return await get_ai_client().post(
+        url, json=payload, headers=headers,
+        timeout=aiohttp.ClientTimeout(
+            total=deadline - time.monotonic(),
+            connect=settings.AI_HTTP_CONNECT_TIMEOUT_SECONDS,
+            sock_read=settings.AI_HTTP_READ_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+def _valid(task: asyncio.Task) -> bool:
+    return task.exception() is None and task.result().status not in RETRY_STATUSES
+
+
+async def _send_hedge(url: str, payload: dict, headers: dict, deadline: float,
+                      cost: int) -> aiohttp.ClientResponse:
+    # Дубль - такой же запрос к модели: он тоже списывается с лимитов
+    async with _rate_limited(cost, deadline):
+        return await _send(*_hedge_target(url, payload, headers), deadline)
+
+
+async def _post(url: str, payload: dict, headers: dict, deadline: float,
+                cost: int) -> tuple[aiohttp.ClientResponse, bool]:
+    """
+    Отправляет запрос; с AI_HEDGE_ENABLED, если основной не ответил за
+    hedger.delay(), отправляет дубль и отдает первый успешный ответ.
+    Возвращает ответ и признак того, что он пришел с основного адреса.
+    Если оба неуспешны, результат основного (ответ или исключение).
+    """
+    if not settings.AI_HEDGE_ENABLED:
+        return await _send(url, payload, headers, deadline), True
+
+    hedger.requests += 1
+    started = time.monotonic()
+    primary = asyncio.create_task(_send(url, payload, headers, deadline))
+    tasks = {primary}
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedger.delay())
+        if not done:
+            hedger.hedged += 1
+            tasks.add(asyncio.create_task(_send_hedge(url, payload, headers, deadline, cost)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if primary in done:
+                hedger.observe(time.monotonic() - started)
+            winner = next((task for task in done if _valid(task)), None)
+            if winner is not None:
+                break
+        else:
+            winner = primary
+
+        if len(tasks) > 1:
+            if winner is primary:
+                hedger.primary_wins += 1
+            elif _valid(winner):
+                hedger.hedge_wins += 1
+        return winner.result(), winner is primary
+    finally:
+        for task in tasks:
+            if not task.done():
+                if task is primary:
+                    # Отмененный основной запрос шел не меньше этого: без такого
+                    # замера хвост задержек пропадает и delay() только падает
+                    hedger.observe(time.monotonic() - started)
+                task.cancel()
+            elif task is not winner and task.exception() is None:
+                task.result().release()
+
+
+def _backoff(attempt: int, resp: aiohttp.ClientResponse | None) -> float:
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    # Exponential backoff с full jitter
+    cap = min(settings.AI_RETRY_MAX_DELAY_SECONDS,
+              settings.AI_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+@asynccontextmanager
+async def ai_request(url: str, payload: dict,
+                     headers: dict) -> AsyncIterator[aiohttp.ClientResponse]:
+    """
+    POST к модели с повторами на 429/5xx и сетевых ошибках в пределах
+    AI_REQUEST_BUDGET_SECONDS, медленные запросы дублируются (_post).
+    Отдает ответ с любым статусом: после исчерпания попыток вызывающий
+    код сам разбирает неуспешный статус.
+    Бросает AIUnavailableError, если breaker открыт или бюджет исчерпан.
+    """
+    deadline = time.monotonic() + settings.AI_REQUEST_BUDGET_SECONDS
+    attempts = max(settings.AI_RETRY_ATTEMPTS, 1)
+    cost = estimate_tokens(payload)
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise AIUnavailableError("circuit open")
+
+        last = attempt == attempts - 1
+        resp = None
+        async with _rate_limited(cost, deadline):
+            try:
+                resp, from_primary = await _post(url, payload, headers, deadline, cost)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                breaker.record(False)
+                if last:
+                    raise
+            else:
+                ok = resp.status not in RETRY_STATUSES
+                # Ответ запасного адреса не говорит о здоровье и лимитах основного
+                if from_primary:
+                    breaker.record(ok)
+                    if settings.AI_RATE_LIMIT_ENABLED:
+                        await rate_limiter.observe(resp.status, resp.headers)
+                if ok or last:
+                    async with resp:
+                        yield resp
+                    return
+                resp.release()
+
+        delay = _backoff(attempt, resp)
+        if time.monotonic() + delay >= deadline:
+            raise AIUnavailableError("request budget exhausted")
+        await asyncio.sleep(delay)
+
+
+@asynccontextmanager
+async def _rate_limited(cost: int, deadline: float) -> AsyncIterator[None]:
+    if not settings.AI_RATE_LIMIT_ENABLED:
+        yield
+        return
+    # Бюджет ограничивает только ожидание слота, не сам запрос
+    timeout = asyncio.timeout(deadline - time.monotonic())
+    try:
+        async with timeout, rate_limiter.slot(cost):
+            timeout.reschedule(None)
+            yield
+    except TimeoutError:
+        if timeout.expired():
+            raise AIUnavailableError("request budget exhausted")
+        raise
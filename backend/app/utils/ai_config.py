@@ -1,7 +1,15 @@
 from uuid import uuid4
 
-ai_url = "https://api.openai.com/v1/chat/completions"
-ai_model = "gpt-4.1-mini"
+from app.config import get_settings
+from app.schemas.ai import AICheckResult, AICheckBatchResult, AIGeneratedQuestions, \
+    AIScoreBatchResult
+from app.utils.prompt_builder import RESULTS_LEGEND, encode_quiz_results
+from app.utils.structured_output import response_format
+
+
+# Провайдер задается в .env: например, локальный benchmarks.fake_openai
+ai_url = get_settings().AI_URL
+ai_model = get_settings().AI_MODEL
 
 
 async def get_headers(api_key):
@@ -11,18 +19,49 @@ async def get_headers(api_key):
     }
 
 
+check_rules = (
+    "Если пользователь ответил правильно, ты возвращаешь score = 2, feedback: Всё верно! "
+    "Если пользователь ответил частично правильно, ты возвращаешь score = 1, и свой feedback "
+    "Если пользователь ответил неправильно ты возвращаешь score = 0, и свой feedback "
+)
+
+
+def fast_grading() -> bool:
+    return get_settings().AI_GRADING_MODE == "fast"
+
+
+def _short_feedback_rules() -> str:
+    # В режиме fast ответ ограничен max_tokens, поэтому score идет первым
+    if not fast_grading():
+        return ""
+    return (
+        "Сначала поле score, затем feedback: одно-два предложения, "
+        f"не длиннее {get_settings().AI_GRADING_FEEDBACK_MAX_CHARS} символов. "
+    )
+
+
+def _max_tokens(items: int = 1) -> dict:
+    if not fast_grading():
+        return {}
+    return {"max_tokens": get_settings().AI_GRADING_MAX_TOKENS * items}
+
+
 async def payload_check_ai_question(description, answer):
+    stream = fast_grading()
     return {
         "model": ai_model,
+        **response_format(AICheckResult),
+        **_max_tokens(),
+        "stream": stream,
+        **({"stream_options": {"include_usage": True}} if stream else {}),
         "messages": [
             {
                 "role": "system",
                 "content": (
-                    "Ты проверяешь, правильно ли ответил пользователь на вопрос. "
-                    "Если пользователь ответил правильно, ты возвращаешь score = 2, feedback: Всё верно! "
-                    "Если пользователь ответил частично правильно, ты возвращаешь score = 1, и свой feedback "
-                    "Если пользователь ответил неправильно ты возвращаешь score = 0, и свой feedback "
-                    "Верни json объект { score: int, feedback: str }. "
+                    "Ты проверяешь, правильно ли ответил пользователь на вопрос. " +
+                    check_rules +
+                    "Верни json объект { score: int, feedback: str }. " +
+                    _short_feedback_rules() +
                     "Внутри feedback пиши в стиле html (используй html-теги вместо Markdown и `\\n`)"
                 )
             },
@@ -34,54 +73,127 @@ async def payload_check_ai_question(description, answer):
     }
 
 
-def final_feedback(description):
+async def payload_check_ai_questions_batch(items):
+    numbered = "\n".join(
+        f'{idx}. Вопрос: {description}. Ответ пользователя: {answer}'
+        for idx, (description, answer) in enumerate(items, start=1)
+    )
     return {
         "model": ai_model,
+        **response_format(AICheckBatchResult),
+        **_max_tokens(len(items)),
         "messages": [
             {
                 "role": "system",
                 "content": (
-                    "Не задавай вопросов. "
-                    "Не проси что-то добавить или отправить дополнительную информацию. "
-                    "Пользователь только получит этот единственный ответ, он не сможет что-то еще отправить и получить. "
-                    "Дай максимально полный и развернуый фидбэк. "
-                    "Оформи свой ответ в стиле html (используй html-теги вместо Markdown и `\\n`). "
+                    "Ты проверяешь, правильно ли пользователь ответил на каждый из пронумерованных вопросов. "
+                    "Каждый вопрос оценивай независимо от остальных. " +
+                    check_rules +
+                    "Верни json объект { results: list [ { score: int, feedback: str } ] }, "
+                    "где results содержит ровно по одному элементу на каждый вопрос в том же порядке. " +
+                    _short_feedback_rules() +
+                    "Внутри feedback пиши в стиле html (используй html-теги вместо Markdown и `\\n`)"
                 )
             },
             {
                 "role": "user",
+                "content": numbered
+            },
+        ],
+    }
+
+
+async def payload_score_ai_questions_batch(items):
+    """
+    Только оценки, без фидбэка: ответ модели - несколько токенов на вопрос.
+    """
+    numbered = "\n".join(
+        f'{idx}. Вопрос: {description}. Ответ пользователя: {answer}'
+        for idx, (description, answer) in enumerate(items, start=1)
+    )
+    return {
+        "model": ai_model,
+        **response_format(AIScoreBatchResult),
+        "max_tokens": 16 * len(items) + 16,
+        "messages": [
+            {
+                "role": "system",
                 "content": (
-                    "По каким темам мне надо подтянуть знания, если на тесте я ответил так:\n" + 
-                    str(description) +
-                    "\nтут question оначает вопрос, а is_user_right правильно ли я на него ответил\n"
+                    "Ты проверяешь, правильно ли пользователь ответил на каждый из пронумерованных вопросов. "
+                    "Каждый вопрос оценивай независимо от остальных. "
+                    "Если ответ правильный, score = 2, если частично правильный, score = 1, "
+                    "если неправильный, score = 0. "
+                    "Верни только json объект { results: list [ { score: int } ] }, "
+                    "где results содержит ровно по одному элементу на каждый вопрос в том же порядке."
                 )
             },
+            {
+                "role": "user",
+                "content": numbered
+            },
         ],
     }
 
 
-async def payload_generate_ai_question(topic: str, count: int):
+# Системные промпты не меняются от запроса к запросу: провайдер кэширует
+# одинаковый префикс, все переменное идет в конец, в сообщение пользователя
+FEEDBACK_SYSTEM_PROMPT = (
+    "Не задавай вопросов. "
+    "Не проси что-то добавить или отправить дополнительную информацию. "
+    "Пользователь только получит этот единственный ответ, он не сможет что-то еще отправить и получить. "
+    "Дай максимально полный и развернуый фидбэк. "
+    "Оформи свой ответ в стиле html (используй html-теги вместо Markdown и `\\n`). " +
+    RESULTS_LEGEND
+)
+
+GENERATION_SYSTEM_PROMPT = (
+    "Ты генерируешь заданное количество разных вопросов для самотестирования по заданной теме. "
+    "Вопрос не должен быть слишком длинным, вопрос не должен быть слишком тривиальным. "
+    "Вопрос должен быть с открытым ответом, то есть без выбора вариантов ответа, "
+    "пользователь должен отвечать письменно на вопрос. "
+    "Не проси что-то добавить или отправить дополнительную информацию. "
+    "Верни json объект вопроса { questions: list [ description: str ] }. "
+)
+
+
+def final_feedback(description, stream: bool = False):
     return {
         "model": ai_model,
+        "stream": stream,
+        **({"stream_options": {"include_usage": True}} if stream else {}),
         "messages": [
             {
                 "role": "system",
+                "content": FEEDBACK_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
                 "content": (
-                    "Ты генерируешь заданное количество разных вопросов для самотестирования по заданной теме. "
-                    "Вопрос не должен быть слишком длинным, вопрос не должен быть слишком тривиальным. "
-                    "Вопрос должен быть с открытым ответом, то есть без выбора вариантов ответа, "
-                    "пользователь должен отвечать письменно на вопрос. "
-                    "Не проси что-то добавить или отправить дополнительную информацию. "
-                    "Верни json объект вопроса { questions: list [ description: str ] }. "
-                    f"Код генерации: {uuid4()}"
-
+                    "По каким темам мне надо подтянуть знания, если на тесте я ответил так:\n" +
+                    encode_quiz_results(description)
                 )
             },
+        ],
+    }
+
+
+async def payload_generate_ai_question(topic: str, count: int, stream: bool = False):
+    return {
+        "model": ai_model,
+        **response_format(AIGeneratedQuestions),
+        "stream": stream,
+        **({"stream_options": {"include_usage": True}} if stream else {}),
+        "messages": [
+            {
+                "role": "system",
+                "content": GENERATION_SYSTEM_PROMPT
+            },
             {
                 "role": "user",
                 "content": (
-                    f"Сгенерируй {count} вопросов по теме {topic}"
+                    # Код генерации делает запросы разными, чтобы вопросы не повторялись
+                    f"Сгенерируй {count} вопросов по теме {topic}. Код генерации: {uuid4().hex[:8]}"
                 )
             },
         ],
-    }
\ No newline at end of file
+    }
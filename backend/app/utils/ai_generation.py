@@ -1,86 +1,499 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-import aiohttp
+import asyncio
 import json
+from logging import getLogger
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncIterator
 from sqlalchemy.future import select 
 from uuid import UUID
 
 
 from app.database.models import AIQuestion
+from app.schemas.ai import AICheckResult, AICheckBatchResult, AIGeneratedQuestion, \
+    AIGeneratedQuestions, AIScoreBatchResult
 from app.utils.ai_config import (
     ai_url,
     final_feedback,
     get_headers,
     payload_check_ai_question,
+    payload_check_ai_questions_batch,
     payload_generate_ai_question,
+    payload_score_ai_questions_batch,
 )
 from app.config import get_settings
+from app.utils.ai_client import AI_ERRORS, ai_request
+from app.utils.ai_metrics import CallRecord, track_call
+from app.utils.json_stream import CheckResultStream, JsonArrayStream
+from app.utils.structured_output import parse_output
+from app.utils.grading_cache import grading_cache, grading_key, is_cacheable, normalize_text
+from app.utils.pregrader import pregrader
+from app.utils.rate_limiter import estimate_tokens
+
+
+logger = getLogger(__name__)
 
 
 async def check_ai_question_utils(question_id: UUID,
                                   user_answer: str,
                                   session: AsyncSession):
-    query = select(AIQuestion.description).where(AIQuestion.id == question_id)
-    res = await session.execute(query)
-    question_description = res.one_or_none()
+    query = select(AIQuestion.description, AIQuestion.explanation).where(AIQuestion.id == question_id)
+    row = (await session.execute(query)).one_or_none()
+    description, explanation = row if row is not None else (None, None)
 
-    return await ai_check(question_description, user_answer)
+    if get_settings().PREGRADE_ENABLED:
+        result = pregrader.grade(user_answer, explanation)
+        if result is not None:
+            return result
+    return await ai_check(description, user_answer)
             
 
+def _attempts() -> int:
+    # Ответ не по схеме запрашивается заново не больше AI_STRUCTURED_RETRIES раз
+    return 1 + max(get_settings().AI_STRUCTURED_RETRIES, 0)
+
+
+async def _read_content(resp, call: CallRecord) -> str:
+    data = await resp.json()
+    call.usage = data.get("usage")
+    return data["choices"][0]["message"]["content"]
+
+
 async def get_ai_feedback(questions):
     payload = final_feedback(questions)
     headers = await get_headers(get_settings().API_KEY)
-    async with aiohttp.ClientSession() as client:
-        async with client.post(ai_url, json=payload, headers=headers) as resp:
+    try:
+        async with track_call("feedback") as call, ai_request(ai_url, payload, headers) as resp:
+            call.status = resp.status
             if resp.status == 200:
-                data = await resp.json()
-                return data["choices"][0]["message"]["content"]
+                return await _read_content(resp, call)
             else:
                 return f"check_error, status: {resp.status}"
+    except AI_ERRORS as e:
+        logger.warning("Feedback request failed: %r", e)
+        return f"check_error, {e.__class__.__name__}"
+
+
+class _StatusError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"status: {status}")
+        self.status = status
+
+
+async def _stream_content(payload: dict, call: CallRecord) -> AsyncIterator[str]:
+    """
+    Куски текста ответа модели в режиме stream. usage приходит последним
+    куском без choices (stream_options.include_usage).
+    """
+    headers = await get_headers(get_settings().API_KEY)
+    async with ai_request(ai_url, payload, headers) as resp:
+        call.status = resp.status
+        if resp.status != 200:
+            raise _StatusError(resp.status)
+        async for line in resp.content:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+            event = json.loads(data)
+            if event.get("usage"):
+                call.usage = event["usage"]
+            if not event.get("choices"):
+                continue
+            chunk = event["choices"][0]["delta"].get("content")
+            if chunk:
+                yield chunk
+
+
+async def stream_ai_feedback(questions) -> AsyncIterator[str]:
+    """
+    Рекомендации в режиме stream: отдает куски html по мере генерации.
+    При ошибке до первого куска отдает строку check_error, как get_ai_feedback.
+    """
+    sent = False
+    try:
+        async with track_call("feedback") as call:
+            async for chunk in _stream_content(final_feedback(questions, stream=True), call):
+                sent = True
+                yield chunk
+    except _StatusError as e:
+        yield f"check_error, {e}"
+    except (*AI_ERRORS, ValueError, KeyError, IndexError) as e:
+        logger.warning("Feedback stream interrupted: %r", e)
+        if not sent:
+            yield f"check_error, {e.__class__.__name__}"
+
+
+async def stream_generate_ai_question(topic: str, count: int) -> AsyncIterator[str]:
+    """
+    Генерация в режиме stream: каждый вопрос отдается, как только его
+    JSON-объект пришел целиком. Оборванный хвост ответа отбрасывается.
+    """
+    payload = await payload_generate_ai_question(topic, count, stream=True)
+    parser = JsonArrayStream()
+    try:
+        async with track_call("generate") as call:
+            parsed = 0
+            async for chunk in _stream_content(payload, call):
+                for question in parser.feed(chunk):
+                    try:
+                        description = AIGeneratedQuestion.model_validate(question).description \
+                            if isinstance(question, dict) else question
+                    except ValueError:
+                        call.parse_failed = True
+                        continue
+                    if isinstance(description, str) and description:
+                        parsed += 1
+                        yield description
+            call.parse_failed = call.parse_failed or parsed == 0
+    except (_StatusError, *AI_ERRORS, ValueError, KeyError, IndexError) as e:
+        logger.warning("Question generation stream interrupted: %r", e)
+
+
+@dataclass(slots=True)
+class _Flight:
+    """
+    Идущий запрос генерации: questions пополняется по мере разбора ответа.
+    """
+    count: int
+    questions: list[str] = field(default_factory=list)
+    updated: asyncio.Condition = field(default_factory=asyncio.Condition)
+    error: str | None = None
+    finished: bool = False
+    duplicates: int = 0
+    task: asyncio.Task | None = None
+
+
+# Идущие запросы генерации по темам
+_generating: dict[str, list[_Flight]] = {}
+generation_stats = {"upstream_calls": 0, "collapsed_calls": 0, "early_returns": 0,
+                    "chunk_requests": 0}
+
+
+async def _add_question(flight: _Flight, question: str, seen: set[str],
+                        filled: asyncio.Event) -> None:
+    key = normalize_text(question)
+    if len(flight.questions) >= flight.count:
+        return
+    if key in seen:
+        flight.duplicates += 1
+        return
+    seen.add(key)
+    async with flight.updated:
+        flight.questions.append(question)
+        flight.updated.notify_all()
+    if len(flight.questions) >= flight.count:
+        filled.set()
+
+
+async def _generate_chunk(flight: _Flight, topic: str, count: int, seen: set[str],
+                          filled: asyncio.Event) -> None:
+    if get_settings().AI_GENERATION_STREAM:
+        async for question in stream_generate_ai_question(topic, count):
+            await _add_question(flight, question, seen, filled)
+        return
+    questions = await _generate_ai_question(topic, count)
+    if not isinstance(questions, list):
+        flight.error = questions
+        return
+    for question in questions:
+        await _add_question(flight, question, seen, filled)
+
+
+async def _run_flight(flight: _Flight, topic: str) -> None:
+    """
+    Большой count делится на запросы по AI_GENERATION_CHUNK_SIZE вопросов,
+    которые идут параллельно: длинный ответ модели - основная часть задержки.
+    Повторы отбрасываются; как только набралось count, остальные запросы
+    отменяются. Второй заход добирает только вопросы вместо выпавших
+    повторов и не идет, если первый ничего не дал (ошибка провайдера).
+    """
+    size = max(get_settings().AI_GENERATION_CHUNK_SIZE, 1)
+    seen: set[str] = set()
+    filled = asyncio.Event()
+    try:
+        for round_ in range(2):
+            missing = flight.count - len(flight.questions)
+            if round_:
+                if not flight.questions:
+                    break
+                missing = min(missing, flight.duplicates)
+            if missing <= 0:
+                break
+            generation_stats["chunk_requests"] += -(-missing // size)
+            pending = {
+                asyncio.create_task(_generate_chunk(flight, topic, min(size, missing - start),
+                                                    seen, filled))
+                for start in range(0, missing, size)
+            }
+            filled_waiter = asyncio.create_task(filled.wait())
+            try:
+                while pending and not filled.is_set():
+                    _, pending = await asyncio.wait(pending | {filled_waiter},
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                    pending.discard(filled_waiter)
+            finally:
+                filled_waiter.cancel()
+                for task in pending:
+                    task.cancel()
+        if not flight.questions:
+            flight.error = flight.error or "check_error, no questions generated"
+    finally:
+        async with flight.updated:
+            flight.finished = True
+            flight.updated.notify_all()
+
+
+def _start_flight(topic: str, count: int, register: bool) -> _Flight:
+    generation_stats["upstream_calls"] += 1
+    flight = _Flight(count=count)
+    flight.task = asyncio.create_task(_run_flight(flight, topic))
+    if register:
+        flights = _generating.setdefault(topic, [])
+        flights.append(flight)
+
+        def _done(_):
+            flights.remove(flight)
+            if not flights and _generating.get(topic) is flights:
+                del _generating[topic]
+
+        flight.task.add_done_callback(_done)
+    return flight
 
 
-async def generate_ai_question(topic: str, count: int):
+async def generate_ai_question(topic: str, count: int, coalesce: bool = True,
+                               timeout: float | None = None):
+    """
+    Генерирует count вопросов по теме. Одновременные вызовы для той же темы
+    ждут уже идущий запрос, если он генерирует не меньше вопросов, и
+    получают первые count из них. coalesce=False - отдельный запрос
+    (вопросы уйдут в буфер и не должны совпасть с уже выданными).
+    Через timeout секунд возвращает то, что успело сгенерироваться.
+    """
+    flight = None
+    if coalesce:
+        flight = next((flight for flight in _generating.get(topic, []) if flight.count >= count), None)
+        if flight is not None:
+            generation_stats["collapsed_calls"] += 1
+    if flight is None:
+        flight = _start_flight(topic, count, register=coalesce)
+
+    def ready() -> bool:
+        return len(flight.questions) >= count or flight.finished
+
+    async with flight.updated:
+        try:
+            await asyncio.wait_for(flight.updated.wait_for(ready), timeout)
+        except asyncio.TimeoutError:
+            generation_stats["early_returns"] += 1
+        questions = flight.questions[:count]
+
+    if not questions and flight.error:
+        return flight.error
+    return questions
+
+
+async def _generate_ai_question(topic: str, count: int):
     payload = await payload_generate_ai_question(topic, count)
     headers = await get_headers(get_settings().API_KEY)
 
-    async with aiohttp.ClientSession() as client:
-        async with client.post(ai_url, json=payload, headers=headers) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-
-                ai_response_text = data["choices"][0]["message"]["content"]
-                if ai_response_text.startswith("```json"):
-                    ai_response_text = ai_response_text[7:-3].strip()
-                ai_response = json.loads(ai_response_text)
-                
-                ans = []
-                for question in ai_response["questions"]:
-                    ans.append(question["description"])
-
-                return ans
-            else:
-                return f"check_error, status: {resp.status}"
+    try:
+        for _ in range(_attempts()):
+            async with track_call("generate") as call, ai_request(ai_url, payload, headers) as resp:
+                call.status = resp.status
+                if resp.status != 200:
+                    return f"check_error, status: {resp.status}"
+                try:
+                    ai_response, call.repaired = parse_output(
+                        await _read_content(resp, call), AIGeneratedQuestions
+                    )
+                except ValueError as e:
+                    call.parse_failed = True
+                    logger.warning("Malformed generation response: %s", e)
+                    continue
+                return [question.description for question in ai_response.questions]
+    except AI_ERRORS as e:
+        logger.warning("Question generation request failed: %r", e)
+        return f"check_error, {e.__class__.__name__}"
+    return "check_error, invalid response"
 
 
 async def ai_check(description: str, answer: str):
+    """
+    Проверка ответа с кэшем по нормализованным вопросу и ответу.
+    """
+    return (await ai_check_batch([(description, answer)]))[0]
+
+
+async def _stream_check(payload: dict, call: CallRecord) -> dict | None:
+    """
+    Проверка в режиме fast: читает поток, пока не придут score и
+    ограниченный feedback, и закрывает соединение, не дожидаясь конца.
+    """
+    parser = CheckResultStream(get_settings().AI_GRADING_FEEDBACK_MAX_CHARS)
+    received = 0
+    try:
+        # aclosing: ответ и слот лимитера освобождаются сразу, а не сборщиком генераторов
+        async with aclosing(_stream_content(payload, call)) as chunks:
+            async for chunk in chunks:
+                received += len(chunk)
+                result = parser.feed(chunk)
+                if result is not None:
+                    return result
+        # Ответ оборван по max_tokens: берем то, что успело прийти
+        result = parser.finish()
+        call.repaired = result is not None
+        return result
+    finally:
+        if call.usage is None and call.status == 200:
+            # Поток закрыт до последнего куска с usage: токены считаем по оценке
+            output = payload.get("max_tokens") or get_settings().AI_RATE_EXPECTED_OUTPUT_TOKENS
+            call.usage = {
+                "prompt_tokens": estimate_tokens(payload) - output,
+                "completion_tokens": received // 3,
+            }
+
+
+async def _ai_check_uncached(description: str, answer: str):
     headers = await get_headers(get_settings().API_KEY)
     payload = await payload_check_ai_question(description, answer)
 
-    async with aiohttp.ClientSession() as client:
-        async with client.post(ai_url, json=payload, headers=headers) as resp:
-            if resp.status == 200:
-                data = await resp.json()
+    try:
+        if payload["stream"]:
+            for _ in range(_attempts()):
+                async with track_call("check") as call:
+                    try:
+                        result = await _stream_check(payload, call)
+                    except _StatusError as e:
+                        return {"score": 0, "feedback": f"check_error, {e}"}
+                    except (ValueError, KeyError, IndexError) as e:
+                        # Битая строка SSE: как битый JSON в обычном режиме
+                        call.parse_failed = True
+                        logger.warning("Malformed grading stream: %r", e)
+                        continue
+                    if result is None:
+                        call.parse_failed = True
+                        logger.warning("Malformed streamed grading response")
+                        continue
+                    return result
+            return {
+                "score": 0,
+                "feedback": "check_error, invalid response"
+            }
 
-                ai_response_text = data["choices"][0]["message"]["content"]
-                if ai_response_text.startswith("```json"):
-                    ai_response_text = ai_response_text[7:-3].strip()
-                ai_response = json.loads(ai_response_text)
+        for _ in range(_attempts()):
+            async with track_call("check") as call, ai_request(ai_url, payload, headers) as resp:
+                call.status = resp.status
+                if resp.status != 200:
+                    return {
+                        "score": 0,
+                        "feedback": f"check_error, status: {resp.status}"
+                    }
+                try:
+                    ai_response, call.repaired = parse_output(
+                        await _read_content(resp, call), AICheckResult
+                    )
+                except ValueError as e:
+                    call.parse_failed = True
+                    logger.warning("Malformed grading response: %s", e)
+                    continue
+                return ai_response.model_dump()
+    except AI_ERRORS as e:
+        logger.warning("Grading request failed: %r", e)
+        return {
+            "score": 0,
+            "feedback": f"check_error, {e.__class__.__name__}"
+        }
+    return {
+        "score": 0,
+        "feedback": "check_error, invalid response"
+    }
 
-                return {
-                    "score": int(ai_response["score"]),
-                    "feedback": ai_response["feedback"]
-                }
-            else:
-                return {
-                    "score": 0,
-                    "feedback": f"check_error, status: {resp.status}"
-                }
\ No newline at end of file
+
+def _parse_batch_results(ai_response_text: str, expected: int) -> tuple[list[dict], bool]:
+    ai_response, repaired = parse_output(ai_response_text, AICheckBatchResult)
+    if len(ai_response.results) != expected:
+        raise ValueError(f"expected {expected} results, got {len(ai_response.results)}")
+    return [result.model_dump() for result in ai_response.results], repaired
+
+
+def _parse_score_results(ai_response_text: str, expected: int) -> tuple[list[dict], bool]:
+    ai_response, repaired = parse_output(ai_response_text, AIScoreBatchResult)
+    if len(ai_response.results) != expected:
+        raise ValueError(f"expected {expected} results, got {len(ai_response.results)}")
+    return [{"score": result.score, "feedback": ""} for result in ai_response.results], repaired
+
+
+async def _ai_check_batch_uncached(items: list[tuple[str, str]], score_only: bool = False):
+    if len(items) == 1 and not score_only:
+        return [await _ai_check_uncached(*items[0])]
+
+    headers = await get_headers(get_settings().API_KEY)
+    if score_only:
+        payload = await payload_score_ai_questions_batch(items)
+        parse = _parse_score_results
+    else:
+        payload = await payload_check_ai_questions_batch(items)
+        parse = _parse_batch_results
+
+    try:
+        for _ in range(_attempts()):
+            async with track_call("check_scores" if score_only else "check_batch") as call, \
+                    ai_request(ai_url, payload, headers) as resp:
+                call.status = resp.status
+                if resp.status != 200:
+                    # ai_request уже исчерпал повторы: отдельные запросы по
+                    # каждой паре только добавили бы нагрузки на провайдера
+                    logger.warning("Batch grading failed with status %s", resp.status)
+                    return [{"score": 0, "feedback": f"check_error, status: {resp.status}"}
+                            for _ in items]
+                try:
+                    results, call.repaired = parse(await _read_content(resp, call), len(items))
+                except ValueError as e:
+                    call.parse_failed = True
+                    logger.warning("Malformed batch grading response: %s", e)
+                    continue
+                return results
+    except AI_ERRORS as e:
+        logger.warning("Batch grading request failed: %r", e)
+        return [{"score": 0, "feedback": f"check_error, {e.__class__.__name__}"} for _ in items]
+
+    # Ответ так и не разобран: пробуем проверить пары по одной
+    results = await asyncio.gather(
+        *(_ai_check_uncached(description, answer) for description, answer in items),
+        return_exceptions=True,
+    )
+    return [
+        {"score": 0, "feedback": f"check_error, {res.__class__.__name__}"}
+        if isinstance(res, Exception) else res
+        for res in results
+    ]
+
+
+async def ai_check_batch(items: list[tuple[str, str]], score_only: bool = False):
+    """
+    Проверяет несколько пар (вопрос, ответ) одним запросом к модели.
+    Пары из кэша проверок к модели не отправляются.
+    Если ответ модели не разобрать, проверяет каждую пару отдельно;
+    при ошибке запроса отдает check_error по каждой паре.
+    score_only - только оценки с пустым feedback; такие результаты не кэшируются.
+    """
+    if not get_settings().GRADING_CACHE_ENABLED:
+        return await _ai_check_batch_uncached(items, score_only)
+
+    keys = [grading_key(description, answer) for description, answer in items]
+    cached = await grading_cache.get_many(keys)
+
+    pending = [idx for idx, key in enumerate(keys) if key not in cached]
+    graded = {}
+    if pending:
+        results = await _ai_check_batch_uncached([items[idx] for idx in pending], score_only)
+        graded = {keys[idx]: result for idx, result in zip(pending, results)}
+        if not score_only:
+            await grading_cache.put_many(
+                {key: result for key, result in graded.items() if is_cacheable(result)}
+            )
+
+    return [dict(cached.get(key) or graded[key]) for key in keys]
@@ -0,0 +1,142 @@
+import json
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import AsyncIterator
+
+from app.utils.ai_usage import usage_tracker
+
+
+logger = getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Верхняя граница корзины, в которую попадает квантиль q.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def stats(self) -> dict:
+        cumulative, seen = {}, 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": cumulative,
+        }
+
+
+@dataclass(slots=True)
+class OperationStats:
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    parse_failures: int = 0
+    repaired: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.latency.count,
+            "latency_seconds": self.latency.stats(),
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "errors": dict(self.errors),
+            "parse_failures": self.parse_failures,
+            "repaired": self.repaired,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+@dataclass(slots=True)
+class CallRecord:
+    """
+    Заполняется вызывающим кодом внутри track_call.
+    """
+    operation: str
+    status: int | None = None
+    usage: dict | None = None
+    parse_failed: bool = False
+    repaired: bool = False
+
+
+_operations: dict[str, OperationStats] = {}
+
+
+def ai_call_stats() -> dict:
+    return {operation: stats.stats() for operation, stats in _operations.items()}
+
+
+@asynccontextmanager
+async def track_call(operation: str) -> AsyncIterator[CallRecord]:
+    """
+    Замеряет вызов модели, пишет строку лога llm_call с результатом и
+    учитывает запрос в расходе текущего пользователя. Исключение внутри
+    блока учитывается по имени класса и пробрасывается дальше.
+    """
+    call = CallRecord(operation=operation)
+    error = None
+    started = time.perf_counter()
+    try:
+        yield call
+    except BaseException as e:
+        error = e.__class__.__name__
+        raise
+    finally:
+        latency = time.perf_counter() - started
+        stats = _operations.setdefault(operation, OperationStats())
+        stats.latency.observe(latency)
+        if call.status is not None:
+            stats.statuses[call.status] += 1
+        if error is not None:
+            stats.errors[error] += 1
+        if call.parse_failed:
+            stats.parse_failures += 1
+        if call.repaired:
+            stats.repaired += 1
+        usage = call.usage or {}
+        stats.prompt_tokens += usage.get("prompt_tokens") or 0
+        stats.completion_tokens += usage.get("completion_tokens") or 0
+        usage_tracker.record(1, (usage.get("prompt_tokens") or 0) +
+                             (usage.get("completion_tokens") or 0))
+
+        logger.info("llm_call %s", json.dumps({
+            "operation": operation,
+            "latency_ms": round(latency * 1000, 1),
+            "status": call.status,
+            "error": error,
+            "parse_failed": call.parse_failed,
+            "repaired": call.repaired,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        }))
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging import getLogger
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import AIUsage, User
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+# Пользователь, от имени которого идут вызовы модели. Задачи, созданные
+# внутри запроса (проверка квиза, генерация), наследуют значение с контекстом
+current_ai_user: ContextVar[UUID | None] = ContextVar("current_ai_user", default=None)
+
+
+def bucket_start(timestamp: float, size: int) -> datetime:
+    return datetime.fromtimestamp(timestamp - timestamp % size, timezone.utc)
+
+
+class UsageTracker:
+    """
+    Запросы и токены модели по пользователям в корзинах по bucket секунд
+    (таблица AIUsage). Вызовы копятся в памяти воркера и записываются
+    раз в AI_USAGE_FLUSH_INTERVAL_SECONDS; расход за окно window - сумма
+    корзин (с точностью до корзины) плюс еще не записанное.
+    """
+
+    def __init__(self, window: int, bucket: int):
+        self.window = window
+        self.bucket = bucket
+        self._pending: dict[tuple[UUID, datetime], list[int]] = {}
+        self.rejected = 0
+
+    def _since(self) -> datetime:
+        return datetime.fromtimestamp(time.time() - self.window, timezone.utc)
+
+    def _add(self, user_id: UUID, start: datetime, requests: int, tokens: int) -> None:
+        counters = self._pending.setdefault((user_id, start), [0, 0])
+        counters[0] += requests
+        counters[1] += tokens
+
+    def record(self, requests: int, tokens: int) -> None:
+        user_id = current_ai_user.get()
+        if user_id is not None:
+            self._add(user_id, bucket_start(time.time(), self.bucket), requests, tokens)
+
+    async def usage(self, user_id: UUID) -> tuple[int, int]:
+        since = self._since()
+        requests = tokens = 0
+        try:
+            async with session_scope() as session:
+                requests, tokens = (await session.execute(
+                    select(func.coalesce(func.sum(AIUsage.requests), 0),
+                           func.coalesce(func.sum(AIUsage.tokens), 0))
+                    .where(AIUsage.user_id == user_id, AIUsage.bucket_start > since)
+                )).one()
+        except Exception:
+            logger.exception("AI usage lookup failed")
+        for (pending_user, start), (pending_requests, pending_tokens) in self._pending.items():
+            if pending_user == user_id and start > since:
+                requests += pending_requests
+                tokens += pending_tokens
+        return int(requests), int(tokens)
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        query = insert(AIUsage).values([
+            {"user_id": user_id, "bucket_start": start, "requests": requests, "tokens": tokens}
+            for (user_id, start), (requests, tokens) in pending.items()
+        ])
+        query = query.on_conflict_do_update(
+            index_elements=[AIUsage.user_id, AIUsage.bucket_start],
+            set_={
+                "requests": AIUsage.requests + query.excluded.requests,
+                "tokens": AIUsage.tokens + query.excluded.tokens,
+            },
+        )
+        try:
+            async with session_scope() as session:
+                await session.execute(query)
+                await session.commit()
+        except Exception:
+            logger.exception("AI usage flush failed")
+            # Не теряем счетчики: запишем со следующей попыткой
+            for (user_id, start), (requests, tokens) in pending.items():
+                self._add(user_id, start, requests, tokens)
+
+    async def cleanup(self) -> None:
+        cutoff = datetime.fromtimestamp(time.time() - self.window - self.bucket, timezone.utc)
+        async with session_scope() as session:
+            await session.execute(delete(AIUsage).where(AIUsage.bucket_start <= cutoff))
+            await session.commit()
+
+    async def top_users(self, limit: int) -> list[dict]:
+        """
+        Пользователи с наибольшим расходом токенов за окно.
+        """
+        await self.flush()
+        requests = func.sum(AIUsage.requests).label("requests")
+        tokens = func.sum(AIUsage.tokens).label("tokens")
+        async with session_scope() as session:
+            rows = (await session.execute(
+                select(User.id, User.email, User.username, requests, tokens)
+                .join(AIUsage, AIUsage.user_id == User.id)
+                .where(AIUsage.bucket_start > self._since())
+                .group_by(User.id)
+                .order_by(tokens.desc(), requests.desc())
+                .limit(limit)
+            )).all()
+        return [
+            {
+                "user_id": str(row.id),
+                "email": row.email,
+                "username": row.username,
+                "requests": int(row.requests),
+                "tokens": int(row.tokens),
+                "requests_share": round(row.requests / settings.AI_QUOTA_REQUESTS, 3),
+                "tokens_share": round(row.tokens / settings.AI_QUOTA_TOKENS, 3),
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "quota_requests": settings.AI_QUOTA_REQUESTS,
+            "quota_tokens": settings.AI_QUOTA_TOKENS,
+            "pending_buckets": len(self._pending),
+            "rejected": self.rejected,
+        }
+
+
+usage_tracker = UsageTracker(
+    window=settings.AI_QUOTA_WINDOW_SECONDS,
+    bucket=settings.AI_USAGE_BUCKET_SECONDS,
+)
+
+
+async def enforce_ai_quota(user: User) -> None:
+    """
+    Записывает вызовы модели в текущем запросе на user. Если квота за окно
+    уже израсходована, отвечает 429 до любого запроса к модели.
+    """
+    current_ai_user.set(user.id)
+    if not settings.AI_QUOTA_ENABLED:
+        return
+    requests, tokens = await usage_tracker.usage(user.id)
+    if requests >= settings.AI_QUOTA_REQUESTS or tokens >= settings.AI_QUOTA_TOKENS:
+        usage_tracker.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Превышен лимит запросов к ИИ, попробуйте позже",
+            headers={"Retry-After": str(settings.AI_USAGE_BUCKET_SECONDS)},
+        )
+
+
+async def run_usage_flush() -> None:
+    """
+    Фоновый цикл: записывает накопленный расход и удаляет корзины старше окна.
+    """
+    cleaned_at = 0.0
+    while True:
+        await asyncio.sleep(settings.AI_USAGE_FLUSH_INTERVAL_SECONDS)
+        await usage_tracker.flush()
+        if time.monotonic() - cleaned_at >= settings.AI_USAGE_BUCKET_SECONDS:
+            try:
+                await usage_tracker.cleanup()
+                cleaned_at = time.monotonic()
+            except Exception:
+                logger.exception("AI usage cleanup failed")
@@ -0,0 +1,26 @@
+import asyncio
+from datetime import datetime, timezone
+from logging import getLogger
+
+from sqlalchemy import delete
+
+from app.database.connection import session_scope
+
+
+logger = getLogger(__name__)
+
+
+async def run_expiry_cleanup(model, interval: float) -> None:
+    """
+    Фоновый цикл: раз в interval секунд удаляет строки model с истекшим expires_at.
+    """
+    while True:
+        try:
+            async with session_scope() as session:
+                await session.execute(
+                    delete(model).where(model.expires_at <= datetime.now(timezone.utc))
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("%s cleanup failed", model.__tablename__)
+        await asyncio.sleep(interval)
@@ -0,0 +1,242 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from uuid import UUID
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import GeneratedQuestion, GenerationLease, Topic, Chapter
+from app.utils.ai_generation import generate_ai_question
+from app.utils.ai_usage import current_ai_user
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+# (topic_id, chapter_id): ровно одно из значений не None
+PoolOwner = tuple[UUID | None, UUID | None]
+
+_refilling: set[PoolOwner] = set()
+_background_tasks: set[asyncio.Task] = set()
+# Буферы, из которых брали вопросы в этом воркере и которые еще не пополнены:
+# продюсер дополняет их, даже если они опустели до нуля
+_demand: dict[PoolOwner, str] = {}
+# Пополнения делят лимит запросов к модели с пользователями: не больше
+# AI_POOL_MAX_CONCURRENT_REFILLS одновременно
+_refill_slots = asyncio.Semaphore(settings.AI_POOL_MAX_CONCURRENT_REFILLS)
+
+
+def _owner(topic_id: UUID | None, chapter_id: UUID | None) -> PoolOwner:
+    return (topic_id, None) if topic_id else (None, chapter_id)
+
+
+def _owner_filter(owner: PoolOwner):
+    topic_id, chapter_id = owner
+    if topic_id:
+        return GeneratedQuestion.topic_id == topic_id
+    return GeneratedQuestion.chapter_id == chapter_id
+
+
+def _lock_key(owner: PoolOwner) -> str:
+    topic_id, chapter_id = owner
+    return f"generated_question:{topic_id}:{chapter_id}"
+
+
+async def _generate(name: str, count: int, coalesce: bool = True,
+                    timeout: float | None = None) -> list[str]:
+    questions = await generate_ai_question(name, count, coalesce=coalesce, timeout=timeout)
+    # generate_ai_question возвращает строку с ошибкой, если модель недоступна
+    return questions if isinstance(questions, list) else []
+
+
+async def pop_generated_questions(session: AsyncSession, topic_id: UUID | None,
+                                  chapter_id: UUID | None, name: str,
+                                  count: int) -> list[str]:
+    """
+    Забирает count заранее сгенерированных вопросов из буфера темы/раздела.
+    Недостающие (холодный старт) генерируются синхронно.
+    """
+    if count <= 0:
+        return []
+    if not settings.AI_POOL_ENABLED:
+        return await _generate(name, count, timeout=settings.AI_GENERATION_TIMEOUT_SECONDS)
+
+    owner = _owner(topic_id, chapter_id)
+    picked = (
+        select(GeneratedQuestion.id)
+        .where(_owner_filter(owner))
+        .order_by(GeneratedQuestion.created_at)
+        .limit(count)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    query = (
+        delete(GeneratedQuestion)
+        .where(GeneratedQuestion.id.in_(picked))
+        .returning(GeneratedQuestion.description)
+    )
+    descriptions = list((await session.scalars(query)).all())
+    await session.commit()
+
+    _demand[owner] = name
+    schedule_refill(owner, name)
+
+    if len(descriptions) < count:
+        # Квиз не ждет весь ответ модели: через AI_GENERATION_TIMEOUT_SECONDS
+        # отдается то, что уже разобрано из потока
+        descriptions.extend(await _generate(name, count - len(descriptions),
+                                            timeout=settings.AI_GENERATION_TIMEOUT_SECONDS))
+    return descriptions
+
+
+def schedule_refill(owner: PoolOwner, name: str) -> None:
+    """
+    Запускает фоновое пополнение буфера, если оно еще не идет в этом воркере.
+    """
+    if owner in _refilling:
+        return
+    _refilling.add(owner)
+    task = asyncio.create_task(_refill(owner, name))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(lambda _: _refilling.discard(owner))
+
+
+async def _acquire_lease(key: str) -> bool:
+    """
+    Берет аренду key, если ее нет или она истекла. Транзакция короткая:
+    соединение не держится, пока модель генерирует вопросы.
+    """
+    now = datetime.now(timezone.utc)
+    query = insert(GenerationLease).values(
+        key=key, expires_at=now + timedelta(seconds=settings.AI_POOL_LEASE_SECONDS)
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[GenerationLease.key],
+        set_={"expires_at": query.excluded.expires_at},
+        where=GenerationLease.expires_at <= now,
+    ).returning(GenerationLease.key)
+    async with session_scope() as session:
+        acquired = await session.scalar(query)
+        await session.commit()
+    return acquired is not None
+
+
+async def _release_lease(key: str) -> None:
+    async with session_scope() as session:
+        await session.execute(delete(GenerationLease).where(GenerationLease.key == key))
+        await session.commit()
+
+
+async def _pool_size(owner: PoolOwner) -> int:
+    async with session_scope() as session:
+        return await session.scalar(
+            select(func.count(GeneratedQuestion.id)).where(_owner_filter(owner))
+        )
+
+
+async def _store(owner: PoolOwner, key: str, batch: list[str]) -> None:
+    """
+    Сохраняет пачку вопросов и продлевает аренду.
+    """
+    topic_id, chapter_id = owner
+    async with session_scope() as session:
+        session.add_all(
+            GeneratedQuestion(topic_id=topic_id, chapter_id=chapter_id, description=description)
+            for description in batch
+        )
+        await session.execute(
+            update(GenerationLease)
+            .where(GenerationLease.key == key)
+            .values(expires_at=datetime.now(timezone.utc) +
+                    timedelta(seconds=settings.AI_POOL_LEASE_SECONDS))
+        )
+        await session.commit()
+
+
+async def _refill(owner: PoolOwner, name: str) -> None:
+    # Пул общий: пополнение не идет в расход пользователя, чей запрос его запустил
+    current_ai_user.set(None)
+    async with _refill_slots:
+        await _refill_locked(owner, name)
+
+
+async def _refill_locked(owner: PoolOwner, name: str) -> None:
+    key = _lock_key(owner)
+    try:
+        # Пополняет только один воркер, остальные пропускают
+        if not await _acquire_lease(key):
+            return
+    except Exception:
+        logger.exception("Failed to acquire generation lease for %s", owner)
+        return
+
+    try:
+        size = await _pool_size(owner)
+        missing = settings.AI_POOL_TARGET - size if size < settings.AI_POOL_LOW_WATER else 0
+        while missing > 0:
+            # Сессия на время генерации не открыта: каждая пачка пишется отдельно
+            batch = await _generate(name, min(missing, settings.AI_POOL_BATCH), coalesce=False)
+            if not batch:
+                break
+            await _store(owner, key, batch)
+            missing -= len(batch)
+        if missing <= 0:
+            _demand.pop(owner, None)
+    except Exception:
+        logger.exception("Failed to refill generated questions for %s", owner)
+    finally:
+        try:
+            await _release_lease(key)
+        except Exception:
+            logger.exception("Failed to release generation lease for %s", owner)
+
+
+async def _refill_low_pools() -> None:
+    """
+    Дополняет непустые буферы ниже AI_POOL_LOW_WATER и те, из которых брали
+    вопросы в этом воркере. Темы, которые никто не проходит, не генерируются.
+    За обход запускается не больше свободных мест в AI_POOL_MAX_CONCURRENT_REFILLS.
+    """
+    pool_size = func.count(GeneratedQuestion.id)
+    async with session_scope() as session:
+        topics = (await session.execute(
+            select(Topic.id, Topic.name)
+            .join(GeneratedQuestion, GeneratedQuestion.topic_id == Topic.id)
+            .group_by(Topic.id, Topic.name)
+            .having(pool_size < settings.AI_POOL_LOW_WATER)
+        )).all()
+        chapters = (await session.execute(
+            select(Chapter.id, Chapter.name)
+            .join(GeneratedQuestion, GeneratedQuestion.chapter_id == Chapter.id)
+            .group_by(Chapter.id, Chapter.name)
+            .having(pool_size < settings.AI_POOL_LOW_WATER)
+        )).all()
+
+    low = dict(_demand)
+    low.update({(topic_id, None): name for topic_id, name in topics})
+    low.update({(None, chapter_id): name for chapter_id, name in chapters})
+    free = settings.AI_POOL_MAX_CONCURRENT_REFILLS - len(_refilling)
+    waiting = [(owner, name) for owner, name in low.items() if owner not in _refilling]
+    for owner, name in waiting[:max(free, 0)]:
+        schedule_refill(owner, name)
+
+
+async def run_generation_producer() -> None:
+    """
+    Фоновый цикл: периодически дополняет буферы, опустившиеся ниже
+    AI_POOL_LOW_WATER. Буферы хранятся в БД и переживают рестарт.
+    """
+    if not settings.AI_POOL_ENABLED:
+        return
+    while True:
+        try:
+            await _refill_low_pools()
+        except Exception:
+            logger.exception("Generated question producer iteration failed")
+        await asyncio.sleep(settings.AI_POOL_REFILL_INTERVAL_SECONDS)
@@ -0,0 +1,68 @@
+import asyncio
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from app.config import get_settings
+from app.utils.ai_generation import ai_check_batch
+from app.utils.pregrader import pregrader
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+
+def _check_error(e: Exception) -> dict:
+    return {
+        "score": 0,
+        "feedback": f"check_error, {e.__class__.__name__}"
+    }
+
+
+async def _grade_batch(semaphore: asyncio.Semaphore, indices: list[int],
+                       batch: list[tuple[str, str]], on_result) -> list[dict]:
+    async with semaphore:
+        try:
+            results = await ai_check_batch(batch, score_only=settings.AI_QUIZ_SCORE_ONLY)
+        except Exception as e:
+            # Сбой одной проверки не должен ронять весь квиз
+            logger.exception("Open answer grading failed")
+            results = [_check_error(e)] * len(batch)
+    if on_result is not None:
+        for index, result in zip(indices, results):
+            await on_result(index, result)
+    return results
+
+
+async def grade_open_answers(items: list[tuple[str, str]],
+                             on_result: Callable[[int, dict], Awaitable[None]] | None = None,
+                             references: list[str | None] | None = None
+                             ) -> list[dict]:
+    """
+    Проверяет пары (вопрос, ответ) параллельно, не более
+    AI_GRADING_CONCURRENCY запросов к модели одновременно.
+    Очевидные ответы оценивает локальный pregrader (references — эталонные
+    объяснения, если есть), остальные группируются по AI_GRADING_BATCH_SIZE
+    в один запрос (с AI_QUIZ_SCORE_ONLY - только за оценками, без фидбэка).
+    Результаты возвращаются в порядке items; on_result(index, result)
+    вызывается по мере готовности.
+    """
+    results: list[dict | None] = [None] * len(items)
+    if settings.PREGRADE_ENABLED:
+        references = references or [None] * len(items)
+        for index, ((_, answer), reference) in enumerate(zip(items, references)):
+            results[index] = pregrader.grade(answer, reference)
+            if results[index] is not None and on_result is not None:
+                await on_result(index, results[index])
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    semaphore = asyncio.Semaphore(settings.AI_GRADING_CONCURRENCY)
+    size = max(settings.AI_GRADING_BATCH_SIZE, 1)
+    chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+    graded = await asyncio.gather(*(
+        _grade_batch(semaphore, chunk, [items[index] for index in chunk], on_result)
+        for chunk in chunks
+    ))
+    for chunk, batch in zip(chunks, graded):
+        for index, result in zip(chunk, batch):
+            results[index] = result
+    return results
@@ -0,0 +1,149 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import GradingCacheEntry
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+_spaces = re.compile(r"\s+")
+# Снимается только конечная пунктуация предложения: знак, скобки и кавычки
+# меняют смысл ответа ("-2" и "2", "O(1)" и "O(1")
+_sentence_end = ".!?"
+
+
+def normalize_text(text: str | None) -> str:
+    """
+    Приводит текст к виду, в котором «Не знаю.» и «  не   знаю» совпадают.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold().replace("ё", "е")
+    return _spaces.sub(" ", text).strip().rstrip(_sentence_end).rstrip()
+
+
+def grading_key(description: str, answer: str) -> str:
+    normalized = normalize_text(description) + "\x1f" + normalize_text(answer)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class GradingCache:
+    """
+    Двухуровневый кэш проверок: LRU в памяти воркера и таблица GradingCache.
+    """
+
+    def __init__(self, memory_size: int, ttl: int):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._memory: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, result: dict, expires_at: float) -> None:
+        self._memory[key] = (result, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, key: str) -> dict | None:
+        cached = self._memory.get(key)
+        if cached is None:
+            return None
+        result, expires_at = cached
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return result
+
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        found = {}
+        for key in keys:
+            result = self._from_memory(key)
+            if result is not None:
+                found[key] = result
+        self.memory_hits += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            try:
+                async with session_scope() as session:
+                    query = select(GradingCacheEntry).where(
+                        GradingCacheEntry.key.in_(missing),
+                        GradingCacheEntry.expires_at > datetime.now(timezone.utc),
+                    )
+                    entries = (await session.scalars(query)).all()
+            except Exception:
+                logger.exception("Grading cache lookup failed")
+                entries = []
+            for entry in entries:
+                result = {"score": entry.score, "feedback": entry.feedback}
+                self._remember(entry.key, result, entry.expires_at.timestamp())
+                found[entry.key] = result
+            self.db_hits += len(entries)
+            self.misses += len(missing) - len(entries)
+        return found
+
+    async def put_many(self, results: dict[str, dict]) -> None:
+        if not results:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        for key, result in results.items():
+            self._remember(key, result, expires_at.timestamp())
+
+        query = insert(GradingCacheEntry).values([
+            {
+                "key": key,
+                "score": result["score"],
+                "feedback": result["feedback"],
+                "expires_at": expires_at,
+            }
+            for key, result in results.items()
+        ])
+        query = query.on_conflict_do_update(
+            index_elements=[GradingCacheEntry.key],
+            set_={
+                "score": query.excluded.score,
+                "feedback": query.excluded.feedback,
+                "expires_at": query.excluded.expires_at,
+            },
+        )
+        try:
+            async with session_scope() as session:
+                await session.execute(query)
+                await session.commit()
+        except Exception:
+            logger.exception("Grading cache store failed")
+
+    def stats(self) -> dict:
+        requests = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "memory_entries": len(self._memory),
+            "memory_size": self.memory_size,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / requests, 4) if requests else 0.0,
+        }
+
+
+grading_cache = GradingCache(
+    memory_size=settings.GRADING_CACHE_MEMORY_SIZE,
+    ttl=settings.GRADING_CACHE_TTL_SECONDS,
+)
+
+
+def is_cacheable(result: dict) -> bool:
+    # Ошибки проверки (check_error, ...) не кэшируются
+    return not str(result["feedback"]).startswith("check_error")
@@ -0,0 +1,131 @@
+import json
+import re
+
+
+class JsonArrayStream:
+    """
+    Инкрементальный разбор первого JSON-массива в потоке текста.
+    feed() возвращает элементы массива, которые закончились в этом куске:
+    объекты разбираются, как только закрыта их скобка. Обертки вроде
+    ```json и {"questions": ...} пропускаются, незаконченный хвост игнорируется.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._array_depth = None
+        self._in_string = False
+        self._escaped = False
+        self._item: list[str] | None = None
+        self._done = False
+
+    def feed(self, text: str) -> list:
+        items = []
+        for char in text:
+            if self._done:
+                break
+            if self._item is not None:
+                self._item.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._item is not None and self._depth == self._array_depth:
+                        items.append(self._finish())
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._array_depth is not None and self._depth == self._array_depth \
+                        and self._item is None:
+                    self._item = [char]
+            elif char in "{[":
+                if self._array_depth is not None and self._depth == self._array_depth \
+                        and self._item is None:
+                    self._item = [char]
+                self._depth += 1
+                if char == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+            elif char in "}]":
+                self._depth -= 1
+                if self._array_depth is not None and self._depth < self._array_depth:
+                    self._done = True
+                elif self._item is not None and self._depth == self._array_depth:
+                    items.append(self._finish())
+        return [item for item in items if item is not None]
+
+    def _finish(self):
+        text, self._item = "".join(self._item), None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+
+class CheckResultStream:
+    """
+    Инкрементальный разбор ответа проверки { score, feedback } в режиме stream.
+    feed() возвращает результат, как только объект закрыт или feedback
+    набрал max_chars символов: дальше поток можно не читать. finish()
+    достает score и начало feedback из ответа, оборванного по max_tokens.
+    """
+
+    _score = re.compile(r'"score"\s*:\s*([0-2])\b')
+    _feedback = re.compile(r'"feedback"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> dict | None:
+        for idx, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.text += text[:idx + 1]
+                    return self._parse(self.text)
+        self.text += text
+        result = self.finish()
+        if result is not None and len(result["feedback"]) >= self.max_chars:
+            result["feedback"] = result["feedback"][:self.max_chars - 1].rstrip() + "…"
+            return result
+        return None
+
+    def finish(self) -> dict | None:
+        score = self._score.search(self.text)
+        feedback = self._feedback.search(self.text)
+        if score is None or feedback is None:
+            return None
+        try:
+            text = json.loads(f'"{feedback.group(1)}"')
+        except ValueError:
+            return None
+        return {"score": int(score.group(1)), "feedback": text}
+
+    def _parse(self, text: str) -> dict | None:
+        start = text.find("{")
+        try:
+            data = json.loads(text[start:])
+        except ValueError:
+            return self.finish()
+        if not isinstance(data, dict) or data.get("score") not in (0, 1, 2) \
+                or not isinstance(data.get("feedback"), str):
+            return None
+        return {"score": data["score"], "feedback": data["feedback"]}
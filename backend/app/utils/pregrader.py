@@ -0,0 +1,78 @@
+from app.config import get_settings
+from app.utils.grading_cache import normalize_text
+
+
+settings = get_settings()
+
+_no_answer = frozenset({"", "не знаю", "незнаю", "нет ответа", "без ответа", "хз", "idk"})
+
+
+def shingles(text: str, size: int) -> set[str]:
+    """
+    Символьные n-граммы нормализованного текста; короткий текст — одна n-грамма.
+    """
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[idx:idx + size] for idx in range(len(text) - size + 1)}
+
+
+def similarity(first: str, second: str, size: int) -> float:
+    """
+    Коэффициент Жаккара по шинглам двух нормализованных текстов.
+    """
+    first_shingles, second_shingles = shingles(first, size), shingles(second, size)
+    if not first_shingles or not second_shingles:
+        return 0.0
+    return len(first_shingles & second_shingles) / len(first_shingles | second_shingles)
+
+
+class Pregrader:
+    """
+    Локальная проверка очевидных открытых ответов до запроса к модели:
+    пустые и слишком короткие ответы получают 0, почти дословная копия
+    эталонного объяснения — 2. Остальные ответы (None) проверяет модель.
+    """
+
+    def __init__(self, min_length: int, copy_threshold: float, shingle_size: int):
+        self.min_length = min_length
+        self.copy_threshold = copy_threshold
+        self.shingle_size = shingle_size
+        self.empty = 0
+        self.too_short = 0
+        self.copied = 0
+        self.passed = 0
+
+    def grade(self, answer: str, reference: str | None = None) -> dict | None:
+        normalized = normalize_text(answer)
+        if normalized in _no_answer:
+            self.empty += 1
+            return {"score": 0, "feedback": "Ответ не дан."}
+        if len(normalized) < self.min_length:
+            self.too_short += 1
+            return {"score": 0, "feedback": "Ответ слишком короткий, чтобы его засчитать."}
+        if reference:
+            score = similarity(normalized, normalize_text(reference), self.shingle_size)
+            if score >= self.copy_threshold:
+                self.copied += 1
+                return {"score": 2, "feedback": "Всё верно!"}
+        self.passed += 1
+        return None
+
+    def stats(self) -> dict:
+        decided = self.empty + self.too_short + self.copied
+        total = decided + self.passed
+        return {
+            "empty": self.empty,
+            "too_short": self.too_short,
+            "copied": self.copied,
+            "sent_to_llm": self.passed,
+            "llm_calls_avoided": decided,
+            "avoided_rate": round(decided / total, 4) if total else 0.0,
+        }
+
+
+pregrader = Pregrader(
+    min_length=settings.PREGRADE_MIN_LENGTH,
+    copy_threshold=settings.PREGRADE_COPY_THRESHOLD,
+    shingle_size=settings.PREGRADE_SHINGLE_SIZE,
+)
@@ -0,0 +1,53 @@
+from app.config import get_settings
+
+
+settings = get_settings()
+
+# ~3 символа кириллицы на токен; та же оценка, что в rate_limiter
+CHARS_PER_TOKEN = 3
+
+RESULTS_LEGEND = (
+    "Результаты теста приходят по одному вопросу в строке: "
+    "«+» — пользователь ответил верно, «-» — неверно. "
+)
+
+
+def _shorten(text: str, limit: int | None) -> str:
+    text = " ".join(str(text).split())
+    if limit is None or len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + "…"
+
+
+def encode_quiz_results(results: list[dict], token_budget: int | None = None) -> str:
+    """
+    Компактная запись результатов квиза для промпта рекомендаций.
+    results - [{"question": str, "is_user_answer_right": bool}].
+    Если запись не влезает в token_budget, сначала укорачиваются вопросы,
+    затем верные ответы сворачиваются в счетчик, затем отбрасываются
+    неверные сверх бюджета: для рекомендаций важнее всего ошибки.
+    """
+    budget = (token_budget or settings.AI_FEEDBACK_PROMPT_TOKEN_BUDGET) * CHARS_PER_TOKEN
+    wrong = [item["question"] for item in results if not item["is_user_answer_right"]]
+    right = [item["question"] for item in results if item["is_user_answer_right"]]
+
+    for limit in (None, settings.AI_FEEDBACK_QUESTION_MAX_CHARS):
+        lines = [f"- {_shorten(question, limit)}" for question in wrong] + \
+                [f"+ {_shorten(question, limit)}" for question in right]
+        text = "\n".join(lines)
+        if len(text) <= budget:
+            return text
+
+    limit = settings.AI_FEEDBACK_QUESTION_MAX_CHARS
+    summary = f"+ и еще {len(right)} вопросов с верным ответом" if right else ""
+    lines, used = [], len(summary)
+    for idx, question in enumerate(wrong):
+        line = f"- {_shorten(question, limit)}"
+        if used + len(line) + 1 > budget:
+            lines.append(f"- и еще {len(wrong) - idx} вопросов с неверным ответом")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    if summary:
+        lines.append(summary)
+    return "\n".join(lines)
@@ -1,21 +1,31 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, func
+from sqlalchemy import and_, delete, func
 from sqlalchemy.orm import selectinload
 from uuid import UUID
 
 
-from app.database.models import Question, User, Answer, AIQuestion, \
-    Topic, Chapter
+from app.database.models import Question, User, Answer, AIQuestion, Topic
 from app.config import get_settings
+from app.database.connection import session_scope
 from app.schemas import QuestionCreateForm, AnswerCreateForm, \
     UserAnswerForm, CorrectAnswers, \
     QuestionUpdateForm, AnswerUpdateForm, QuizResponse, \
     AIQuestionCreateForm, QuizSubmission
-from app.utils.ai_generation import check_ai_question_utils, get_ai_feedback, \
-    generate_ai_question, ai_check
+from app.utils.ai_generation import get_ai_feedback, stream_ai_feedback
+from app.utils.grading import grade_open_answers
 from app.schemas.question import AIQuestionResponse, QuestionResponse, QuestionResult, QuizResult
+from app.utils.sampling import sample_rows
+from app.utils.question_cache import get_question_pool, get_owner_name, invalidate_topics
+from app.utils.generation_pool import pop_generated_questions
+from app.utils.quiz_snapshot import QuizAnswerKey, SnapshotQuestion, SnapshotAIQuestion, \
+    build_answer_key, load_snapshot, save_snapshot
 
 settings = get_settings()
 
@@ -39,6 +49,7 @@ async def add_question(question: QuestionCreateForm, answers: list[AnswerCreateF
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, question.topic_id)
     return QuestionResponse(
         id=question.id,
         description=question.description,
@@ -60,6 +71,7 @@ async def add_ai_question(question: AIQuestionCreateForm, current_user: User,
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, question.topic_id)
     return AIQuestionResponse(
         id=question.id,
         description=question.description,
@@ -95,6 +107,16 @@ async def get_answers_to_question(question_id: UUID,
     return result.all()
 
 
+def is_answer_right(question_type: int, correct_ids: set[UUID], user_ids: set[UUID]) -> bool:
+    """
+    type 0: выбран ровно один вариант, и он правильный;
+    type 1: выбраны в точности все правильные варианты.
+    """
+    if question_type == 0:
+        return len(user_ids) == 1 and next(iter(user_ids)) in correct_ids
+    return user_ids == correct_ids
+
+
 async def user_answers(response: UserAnswerForm,
                        current_user: User,
                        session: AsyncSession) -> CorrectAnswers:
@@ -109,11 +131,7 @@ async def user_answers(response: UserAnswerForm,
 
     correct_ids = {row[0] for row in result.all()}
     user_ids = set(response.selected_answer_id or [])
-    
-    if question.type == 0:
-        is_right = (len(user_ids) == 1 and next(iter(user_ids)) in correct_ids)
-    else:
-        is_right = (user_ids == correct_ids)
+    is_right = is_answer_right(question.type, correct_ids, user_ids)
 
     return CorrectAnswers(
         is_user_right=is_right,
@@ -121,6 +139,12 @@ async def user_answers(response: UserAnswerForm,
     )
 
 
+async def _question_topic_id(question_id: UUID | None, session: AsyncSession) -> UUID | None:
+    if question_id is None:
+        return None
+    return await session.scalar(select(Question.topic_id).where(Question.id == question_id))
+
+
 async def edit_question(updated_question: QuestionUpdateForm, session: AsyncSession):
     query = select(Question).where(Question.id == updated_question.id)
     question = await session.scalar(query)
@@ -128,6 +152,7 @@ async def edit_question(updated_question: QuestionUpdateForm, session: AsyncSess
     if not question:
         return False
     
+    old_topic_id = question.topic_id
     for key, value in updated_question.model_dump(exclude_none=True).items():
         setattr(question, key, value)
     
@@ -136,6 +161,7 @@ async def edit_question(updated_question: QuestionUpdateForm, session: AsyncSess
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, old_topic_id, question.topic_id)
     return True
 
 
@@ -143,14 +169,16 @@ async def remove_question(question_id: UUID, session: AsyncSession):
     query_answers = delete(Answer).where(Answer.question_id == question_id)
     await session.execute(query_answers)
 
-    query_questions = delete(Question).where(Question.id == question_id)
-    await session.execute(query_questions)
+    query_questions = delete(Question).where(Question.id == question_id) \
+        .returning(Question.topic_id)
+    topic_ids = (await session.scalars(query_questions)).all()
 
     try:
         await session.commit()
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, *topic_ids)
     return True
 
 
@@ -166,21 +194,74 @@ async def edit_answer(updated_answer: AnswerUpdateForm, session: AsyncSession):
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, await _question_topic_id(answer.question_id, session))
     return True
 
 
 async def remove_answer(answer_id: UUID, session: AsyncSession):
-    query = delete(Answer).where(Answer.id == answer_id)
-    await session.execute(query)
+    query = delete(Answer).where(Answer.id == answer_id).returning(Answer.question_id)
+    question_id = await session.scalar(query)
 
     try:
         await session.commit()
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    await invalidate_topics(session, await _question_topic_id(question_id, session))
     return True
 
 
+async def _gather_stages(*stages):
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Первый упавший этап (например, 404) отменяет остальные
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _pool_stage(topic_id: UUID, chapter_id: UUID):
+    pool = await get_question_pool(topic_id, chapter_id)
+    if pool is None:
+        raise HTTPException(404, detail="Тема или раздел не найдены")
+    return pool
+
+
+async def _questions_stage(pool_task, topics, count: int):
+    pool = await pool_task
+    if pool.questions is not None:
+        questions = random.sample(pool.questions, min(count, len(pool.questions)))
+    else:
+        async with session_scope() as session:
+            questions = await sample_rows(session, Question, topics, count,
+                                          options=[selectinload(Question.answers)])
+    if len(questions) < count:
+        raise HTTPException(404, detail="Недостаточно обычных вопросов")
+    return questions
+
+
+async def _ai_questions_stage(pool_task, topics, ai_count: int):
+    pool = await pool_task
+    if pool.ai_questions is not None:
+        ai_questions = random.sample(pool.ai_questions, min(ai_count, len(pool.ai_questions)))
+    else:
+        async with session_scope() as session:
+            ai_questions = await sample_rows(session, AIQuestion, topics, ai_count)
+    if len(ai_questions) < ai_count:
+        raise HTTPException(404, detail="Недостаточно AI-вопросов")
+    return ai_questions
+
+
+async def _owner_name_stage(session: AsyncSession, topic_id: UUID, chapter_id: UUID) -> str:
+    name = await get_owner_name(session, topic_id, chapter_id)
+    if name is None:
+        raise HTTPException(404, detail="Тема или раздел не найдены")
+    return name
+
+
 async def get_quiz_utils(session: AsyncSession, count: int, ai_count: int, 
                          gen_count: int, topic_id: UUID, chapter_id: UUID) -> QuizResponse:
     if (topic_id is None and chapter_id is None):
@@ -188,94 +269,193 @@ async def get_quiz_utils(session: AsyncSession, count: int, ai_count: int,
             404,
             detail="Укажите либо chapter_id и topic_id, либо chapter_id"
         )
-    
-    q1 = select(Question).options(selectinload(Question.answers))
-    q2 = select(AIQuestion)
 
+    # Выборка идет по каждой теме отдельно: так пробы используют (topic_id, random_key)
     if topic_id:
-        q1 = q1.where(Question.topic_id == topic_id)
-        q2 = q2.where(AIQuestion.topic_id == topic_id)
-        q3 = select(Topic).where(Topic.id == topic_id)
+        topics = select(Topic.id).where(Topic.id == topic_id)
     else:
-        q1 = q1.join(Question.topic).where(Topic.chapter_id == chapter_id)
-        q2 = q2.join(AIQuestion.topic).where(Topic.chapter_id == chapter_id)
-        q3 = select(Chapter).where(Chapter.id == chapter_id)
+        topics = select(Topic.id).where(Topic.chapter_id == chapter_id)
+
+    # Этапы независимы и идут параллельно, каждый на своей сессии из пула
+    pool_task = asyncio.ensure_future(_pool_stage(topic_id, chapter_id))
+    stages = [
+        pool_task,
+        _questions_stage(pool_task, topics, count),
+        _ai_questions_stage(pool_task, topics, ai_count),
+    ]
+    if gen_count > 0:
+        stages.append(_owner_name_stage(session, topic_id, chapter_id))
+
+    _, questions, ai_questions, *name = await _gather_stages(*stages)
+    # Сгенерированные вопросы удаляются из буфера, только когда остальные
+    # этапы прошли: при 404 они не теряются
+    gen_questions = await pop_generated_questions(
+        session, topic_id, chapter_id, name[0], gen_count
+    ) if name else []
+
+    answer_key = build_answer_key(questions, ai_questions, gen_questions)
+    quiz_id = await save_snapshot(session, answer_key)
+
+    return QuizResponse(questions=questions, ai_questions=ai_questions,
+                        gen_question=gen_questions, quiz_id=quiz_id)
+
+
+async def _question_keys_from_db(question_ids: set[UUID],
+                                 session: AsyncSession) -> dict[UUID, SnapshotQuestion]:
+    """
+    Вопросы и множества правильных ответов одним запросом.
+    """
+    if not question_ids:
+        return {}
+    query = (
+        select(Question.id, Question.type, Question.description,
+               Question.explanation, Answer.id)
+        .outerjoin(Answer, and_(Answer.question_id == Question.id, Answer.is_correct == True))
+        .where(Question.id.in_(question_ids))
+    )
+    rows = (await session.execute(query)).all()
 
-    q1 = q1.order_by(func.random()).limit(count)
-    res1 = await session.execute(q1)
-    questions = res1.scalars().all()
-    if len(questions) < count:
-        raise HTTPException(404, detail="Недостаточно обычных вопросов")
+    correct_ids: dict[UUID, set[UUID]] = {}
+    for question_id, _, _, _, answer_id in rows:
+        correct_ids.setdefault(question_id, set())
+        if answer_id is not None:
+            correct_ids[question_id].add(answer_id)
 
-    q2 = q2.order_by(func.random()).limit(ai_count)
-    res2 = await session.execute(q2)
-    ai_questions = res2.scalars().all()
-    if len(ai_questions) < ai_count:
-        raise HTTPException(404, detail="Недостаточно AI-вопросов")
-    
-    res3 = await session.execute(q3)
-    gen_topic = res3.scalar_one_or_none().name
-    gen_questions = await generate_ai_question(gen_topic, gen_count)
-    
-    return QuizResponse(questions=questions, ai_questions=ai_questions, gen_question=gen_questions)
+    return {
+        question_id: SnapshotQuestion(
+            type=question_type,
+            description=description,
+            explanation=explanation,
+            correct_answer_ids=frozenset(correct_ids[question_id]),
+        )
+        for question_id, question_type, description, explanation, _ in rows
+    }
 
 
-async def submit_quiz_utils(submission: QuizSubmission, session: AsyncSession):
+async def _ai_question_keys_from_db(question_ids: set[UUID],
+                                    session: AsyncSession) -> dict[UUID, SnapshotAIQuestion]:
+    if not question_ids:
+        return {}
+    query = (
+        select(AIQuestion.id, AIQuestion.description, AIQuestion.explanation)
+        .where(AIQuestion.id.in_(question_ids))
+    )
+    return {
+        question_id: SnapshotAIQuestion(description=description, explanation=explanation)
+        for question_id, description, explanation in (await session.execute(query)).all()
+    }
+
+
+@dataclass(slots=True)
+class PreparedSubmission:
+    """
+    Квиз после проверки вариантов с выбором: answers уже готовы,
+    open_answers - (question_id, вопрос, ответ, эталонное объяснение или None)
+    для проверки моделью.
+    """
+    answers: list[QuestionResult]
+    open_answers: list[tuple[UUID | str, str, str, str | None]]
+
+
+async def prepare_submission(submission: QuizSubmission,
+                             session: AsyncSession) -> PreparedSubmission:
     answers = []
-    for_feedback = []
+
+    # Снимок квиза избавляет от повторного чтения вопросов; без него
+    # (старый клиент или истекший TTL) вопросы читаются из БД
+    answer_key = None
+    if submission.quiz_id:
+        answer_key = await load_snapshot(session, submission.quiz_id)
+    answer_key = answer_key or QuizAnswerKey()
+
+    # Все, чего нет в снимке, дочитывается из БД разом, а не по вопросу
+    questions = dict(answer_key.questions)
+    questions.update(await _question_keys_from_db(
+        {qa.question_id for qa in submission.answers} - questions.keys(), session
+    ))
+    ai_questions = dict(answer_key.ai_questions)
+    ai_questions.update(await _ai_question_keys_from_db(
+        {qa.question_id for qa in submission.ai_answers} - ai_questions.keys(), session
+    ))
 
     for qa in submission.answers:
-        result = await session.execute(
-            select(Answer.id).where(
-                Answer.question_id == qa.question_id,
-                Answer.is_correct == True
-            )
-        )
-        correct_ids = set(result.scalars().all())
+        question = questions.get(qa.question_id)
+        if question is None:
+            raise HTTPException(404, detail=f"Вопрос {qa.question_id} не найден")
         user_ids = set(qa.selected_answer_id or [])
-        question = await session.get(Question, qa.question_id)
-        ans = QuestionResult(
+        answers.append(QuestionResult(
             question_id=qa.question_id,
             description=question.description,
             explanation=question.explanation,
-            is_user_right=user_ids == correct_ids,
-        )
-        answers.append(ans)
-        for_feedback.append({
-            'question': ans.description,
-            'is_user_answer_right': ans.is_user_right
-        })
+            is_user_right=is_answer_right(question.type, question.correct_answer_ids, user_ids),
+        ))
 
+    open_answers = []
     for qa in submission.ai_answers:
-        question = await session.get(AIQuestion, qa.question_id)
-        res = await check_ai_question_utils(qa.question_id, qa.text, session)
-        ans = QuestionResult(
-            question_id=qa.question_id,
-            description=question.description,
-            explanation=res["feedback"],
-            is_user_right=res["score"] > 0,
-        )
-        answers.append(ans)
-        for_feedback.append({
-            'question': ans.description,
-            'is_user_answer_right': ans.is_user_right
-        })
-
+        question = ai_questions.get(qa.question_id)
+        if question is None:
+            raise HTTPException(404, detail=f"Вопрос {qa.question_id} не найден")
+        open_answers.append((qa.question_id, question.description, qa.text,
+                             question.explanation))
     for qa in submission.gen_answers:
-        res = await ai_check(qa.description, qa.answer)
+        description = answer_key.gen_questions.get(qa.question_id, qa.description)
+        open_answers.append((qa.question_id, description, qa.answer, None))
+
+    return PreparedSubmission(answers=answers, open_answers=open_answers)
+
+
+async def grade_submission(prepared: PreparedSubmission,
+                           on_event: Callable[[str, dict], Awaitable[None]] | None = None
+                           ) -> QuizResult:
+    """
+    Проверяет открытые ответы и получает рекомендации. on_event(type, data)
+    получает answers, затем open_answer на каждый ответ, затем куски
+    рекомендаций recommendations_delta и в конце recommendations с полным текстом.
+    """
+    async def emit(kind: str, data: dict) -> None:
+        if on_event is not None:
+            await on_event(kind, data)
+
+    await emit("answers", {
+        "answers": [ans.model_dump(mode="json") for ans in prepared.answers]
+    })
+
+    open_results: list[QuestionResult | None] = [None] * len(prepared.open_answers)
+
+    async def on_grade(index: int, res: dict) -> None:
+        question_id, description, _, _ = prepared.open_answers[index]
         ans = QuestionResult(
-            question_id=qa.question_id,
-            description=qa.description,
+            question_id=question_id,
+            description=description,
             explanation=res["feedback"],
             is_user_right=res["score"] > 0,
         )
-        answers.append(ans)
-        for_feedback.append({
+        open_results[index] = ans
+        await emit("open_answer", {"index": index, **ans.model_dump(mode="json")})
+
+    await grade_open_answers(
+        [(description, answer) for _, description, answer, _ in prepared.open_answers],
+        on_result=on_grade,
+        references=[reference for _, _, _, reference in prepared.open_answers],
+    )
+
+    answers = prepared.answers + open_results
+    for_feedback = [
+        {
             'question': ans.description,
             'is_user_answer_right': ans.is_user_right
-        })
-
-    feedback_res = await get_ai_feedback(for_feedback)
+        }
+        for ans in answers
+    ]
+    if on_event is None:
+        feedback_res = await get_ai_feedback(for_feedback)
+    else:
+        chunks = []
+        async for chunk in stream_ai_feedback(for_feedback):
+            chunks.append(chunk)
+            await emit("recommendations_delta", {"text": chunk})
+        feedback_res = "".join(chunks)
+    await emit("recommendations", {"text": feedback_res})
 
     return QuizResult(
         answers=answers,
@@ -283,6 +463,11 @@ async def submit_quiz_utils(submission: QuizSubmission, session: AsyncSession):
     )
 
 
+async def submit_quiz_utils(submission: QuizSubmission, session: AsyncSession):
+    prepared = await prepare_submission(submission, session)
+    return await grade_submission(prepared)
+
+
 async def get_question_count_utils(topic_id: UUID, chapter_id: UUID, session: AsyncSession):
     if topic_id:
         q1 = select(func.count(Question.id)).where(Question.topic_id == topic_id)
@@ -0,0 +1,263 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import Question, AIQuestion, Topic, Chapter
+
+
+@dataclass(frozen=True, slots=True)
+class CachedAnswer:
+    id: UUID
+    text: str
+    is_correct: bool
+
+
+@dataclass(frozen=True, slots=True)
+class CachedQuestion:
+    id: UUID
+    description: str
+    type: int
+    explanation: str
+    answers: tuple[CachedAnswer, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class CachedAIQuestion:
+    id: UUID
+    description: str
+    explanation: str
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionPool:
+    """
+    Все вопросы темы или раздела. questions/ai_questions равны None, если
+    их больше QUIZ_CACHE_MAX_POOL_QUESTIONS: тогда выборка идет через БД.
+    """
+    name: str
+    topic_ids: frozenset[UUID]
+    questions: tuple[CachedQuestion, ...] | None
+    ai_questions: tuple[CachedAIQuestion, ...] | None
+    loaded_at: float
+
+
+PoolKey = tuple[str, UUID]
+
+
+class QuestionPoolCache:
+    """
+    LRU-кэш пулов вопросов в памяти воркера.
+    Изменения банка вопросов в других воркерах видны не позже чем через ttl.
+    """
+
+    def __init__(self, max_pools: int, ttl: float):
+        self.max_pools = max_pools
+        self.ttl = ttl
+        self._pools: OrderedDict[PoolKey, QuestionPool] = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: PoolKey) -> QuestionPool | None:
+        pool = self._pools.get(key)
+        if pool is None or time.monotonic() - pool.loaded_at > self.ttl:
+            self._pools.pop(key, None)
+            self.misses += 1
+            return None
+        self._pools.move_to_end(key)
+        self.hits += 1
+        return pool
+
+    def peek(self, key: PoolKey) -> QuestionPool | None:
+        pool = self._pools.get(key)
+        if pool is None or time.monotonic() - pool.loaded_at > self.ttl:
+            return None
+        return pool
+
+    def put(self, key: PoolKey, pool: QuestionPool, generation: int) -> None:
+        # Пул, загруженный до инвалидации, уже может быть устаревшим
+        if generation != self._generation or self.max_pools <= 0:
+            return
+        self._pools[key] = pool
+        self._pools.move_to_end(key)
+        while len(self._pools) > self.max_pools:
+            self._pools.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, topic_ids: set[UUID], chapter_ids: set[UUID]) -> None:
+        self._generation += 1
+        for key, pool in list(self._pools.items()):
+            kind, owner_id = key
+            if pool.topic_ids & topic_ids or (kind == "chapter" and owner_id in chapter_ids):
+                del self._pools[key]
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._pools.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "pools": len(self._pools),
+            "max_pools": self.max_pools,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+        }
+
+
+settings = get_settings()
+question_pool_cache = QuestionPoolCache(
+    max_pools=settings.QUIZ_CACHE_MAX_POOLS,
+    ttl=settings.QUIZ_CACHE_TTL_SECONDS,
+)
+
+
+def _to_cached_question(question: Question) -> CachedQuestion:
+    return CachedQuestion(
+        id=question.id,
+        description=question.description,
+        type=question.type,
+        explanation=question.explanation,
+        answers=tuple(
+            CachedAnswer(id=answer.id, text=answer.text, is_correct=answer.is_correct)
+            for answer in question.answers
+        ),
+    )
+
+
+def _to_cached_ai_question(question: AIQuestion) -> CachedAIQuestion:
+    return CachedAIQuestion(
+        id=question.id,
+        description=question.description,
+        explanation=question.explanation,
+    )
+
+
+async def _load_questions(topic_ids: frozenset[UUID]) -> tuple[CachedQuestion, ...] | None:
+    async with session_scope() as session:
+        query = select(func.count(Question.id)).where(Question.topic_id.in_(topic_ids))
+        if await session.scalar(query) > settings.QUIZ_CACHE_MAX_POOL_QUESTIONS:
+            return None
+        result = await session.scalars(
+            select(Question)
+            .options(selectinload(Question.answers))
+            .where(Question.topic_id.in_(topic_ids))
+        )
+        return tuple(_to_cached_question(question) for question in result.all())
+
+
+async def _load_ai_questions(topic_ids: frozenset[UUID]) -> tuple[CachedAIQuestion, ...] | None:
+    async with session_scope() as session:
+        query = select(func.count(AIQuestion.id)).where(AIQuestion.topic_id.in_(topic_ids))
+        if await session.scalar(query) > settings.QUIZ_CACHE_MAX_POOL_QUESTIONS:
+            return None
+        result = await session.scalars(
+            select(AIQuestion).where(AIQuestion.topic_id.in_(topic_ids))
+        )
+        return tuple(_to_cached_ai_question(question) for question in result.all())
+
+
+async def _load_pool(topic_id: UUID | None, chapter_id: UUID | None) -> QuestionPool | None:
+    async with session_scope() as session:
+        if topic_id:
+            owner = await session.scalar(select(Topic).where(Topic.id == topic_id))
+            topic_ids = frozenset([topic_id]) if owner else frozenset()
+        else:
+            owner = await session.scalar(select(Chapter).where(Chapter.id == chapter_id))
+            result = await session.scalars(select(Topic.id).where(Topic.chapter_id == chapter_id))
+            topic_ids = frozenset(result.all())
+    if owner is None:
+        return None
+
+    questions, ai_questions = await asyncio.gather(
+        _load_questions(topic_ids),
+        _load_ai_questions(topic_ids),
+    )
+    return QuestionPool(
+        name=owner.name,
+        topic_ids=topic_ids,
+        questions=questions,
+        ai_questions=ai_questions,
+        loaded_at=time.monotonic(),
+    )
+
+
+async def _load_and_store(key: PoolKey, topic_id: UUID | None,
+                          chapter_id: UUID | None) -> QuestionPool | None:
+    generation = question_pool_cache.generation
+    pool = await _load_pool(topic_id, chapter_id)
+    if pool is not None:
+        question_pool_cache.put(key, pool, generation)
+    return pool
+
+
+_loading: dict[PoolKey, asyncio.Task] = {}
+
+
+def _pool_key(topic_id: UUID | None, chapter_id: UUID | None) -> PoolKey:
+    return ("topic", topic_id) if topic_id else ("chapter", chapter_id)
+
+
+async def get_question_pool(topic_id: UUID | None,
+                            chapter_id: UUID | None) -> QuestionPool | None:
+    """
+    Возвращает пул вопросов темы (если задан topic_id) или раздела.
+    None, если такой темы или раздела нет. Одновременные промахи по одному
+    ключу ждут одну и ту же загрузку.
+    """
+    key = _pool_key(topic_id, chapter_id)
+    pool = question_pool_cache.get(key)
+    if pool is not None:
+        return pool
+
+    task = _loading.get(key)
+    if task is None:
+        task = asyncio.create_task(_load_and_store(key, topic_id, chapter_id))
+        _loading[key] = task
+        task.add_done_callback(lambda _: _loading.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def get_owner_name(session: AsyncSession, topic_id: UUID | None,
+                         chapter_id: UUID | None) -> str | None:
+    """
+    Название темы или раздела: из кэша пулов, иначе одним легким запросом.
+    None, если такой темы или раздела нет.
+    """
+    pool = question_pool_cache.peek(_pool_key(topic_id, chapter_id))
+    if pool is not None:
+        return pool.name
+    if topic_id:
+        query = select(Topic.name).where(Topic.id == topic_id)
+    else:
+        query = select(Chapter.name).where(Chapter.id == chapter_id)
+    row = (await session.execute(query)).one_or_none()
+    return None if row is None else row.name or ""
+
+
+async def invalidate_topics(session: AsyncSession, *topic_ids: UUID | None) -> None:
+    """
+    Сбрасывает пулы тем и разделов, в которые входят topic_ids.
+    Вызывается после успешного commit изменений банка вопросов.
+    """
+    topic_ids = {topic_id for topic_id in topic_ids if topic_id is not None}
+    if not topic_ids:
+        return
+    result = await session.scalars(select(Topic.chapter_id).where(Topic.id.in_(topic_ids)))
+    question_pool_cache.invalidate(topic_ids, set(result.all()))
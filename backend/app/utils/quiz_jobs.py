@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import AsyncIterator
+from uuid import UUID
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import QuizJob
+from app.utils.question import PreparedSubmission, grade_submission
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+FINISHED = ("done", "failed")
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _update_job(job_id: UUID, **values) -> None:
+    async with session_scope() as session:
+        await session.execute(
+            update(QuizJob).where(QuizJob.id == job_id).values(updated_at=func.now(), **values)
+        )
+        await session.commit()
+
+
+async def _heartbeat(job_id: UUID) -> None:
+    """
+    Пока задача идет, обновляет updated_at: по нему видно, что воркер жив.
+    """
+    while True:
+        await asyncio.sleep(settings.QUIZ_JOB_HEARTBEAT_SECONDS)
+        try:
+            await _update_job(job_id)
+        except Exception:
+            logger.exception("Quiz job %s heartbeat failed", job_id)
+
+
+async def _run_job(job_id: UUID, prepared: PreparedSubmission) -> None:
+    events = []
+    lock = asyncio.Lock()
+    flushed_at = 0.0
+
+    async def on_event(kind: str, data: dict) -> None:
+        nonlocal flushed_at
+        # Под замком: иначе более старый список событий может перезаписать новый
+        async with lock:
+            events.append({"type": kind, "data": data})
+            # Куски рекомендаций пишутся в БД не чаще QUIZ_JOB_FLUSH_INTERVAL_SECONDS,
+            # остальные события сразу
+            now = time.monotonic()
+            if kind == "recommendations_delta" and \
+                    now - flushed_at < settings.QUIZ_JOB_FLUSH_INTERVAL_SECONDS:
+                return
+            flushed_at = now
+            await _update_job(job_id, events=list(events))
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        result = await grade_submission(prepared, on_event)
+        async with lock:
+            await _update_job(job_id, status="done", result=result.model_dump(mode="json"))
+    except Exception as e:
+        logger.exception("Quiz job %s failed", job_id)
+        await _update_job(job_id, status="failed", error=f"{e.__class__.__name__}: {e}")
+    finally:
+        heartbeat.cancel()
+
+
+async def create_quiz_job(session: AsyncSession, user_id: UUID,
+                          prepared: PreparedSubmission) -> UUID:
+    """
+    Сохраняет задачу и запускает проверку в фоне текущего воркера.
+    """
+    job = QuizJob(
+        user_id=user_id,
+        status="running",
+        events=[],
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.QUIZ_JOB_TTL_SECONDS),
+    )
+    session.add(job)
+    await session.commit()
+
+    task = asyncio.create_task(_run_job(job.id, prepared))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return job.id
+
+
+async def get_quiz_job(session: AsyncSession, job_id: UUID, user_id: UUID) -> QuizJob | None:
+    """
+    Задача пользователя. Задача в running без heartbeat дольше
+    QUIZ_JOB_STALE_SECONDS (воркер перезапущен) помечается failed.
+    """
+    query = select(QuizJob).where(QuizJob.id == job_id, QuizJob.user_id == user_id)
+    job = await session.scalar(query)
+    if job is None or job.status != "running":
+        return job
+
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.QUIZ_JOB_STALE_SECONDS)
+    if job.updated_at < stale_before:
+        await session.execute(
+            update(QuizJob)
+            .where(QuizJob.id == job.id, QuizJob.status == "running",
+                   QuizJob.updated_at < stale_before)
+            .values(status="failed", error="worker lost", updated_at=func.now())
+        )
+        await session.commit()
+        await session.refresh(job)
+    return job
+
+
+def _sse(kind: str, data) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_quiz_job(job_id: UUID, user_id: UUID) -> AsyncIterator[str]:
+    """
+    Server-sent events задачи: новые события по мере появления в БД,
+    в конце событие done с итоговым QuizResult или failed с ошибкой.
+    Через QUIZ_JOB_STREAM_MAX_SECONDS отдает timeout и закрывается:
+    клиент может переподключиться или опрашивать /quiz/jobs/{id}.
+    """
+    sent = 0
+    deadline = time.monotonic() + settings.QUIZ_JOB_STREAM_MAX_SECONDS
+    while True:
+        async with session_scope() as session:
+            job = await get_quiz_job(session, job_id, user_id)
+        if job is None:
+            return
+
+        for event in job.events[sent:]:
+            yield _sse(event["type"], event["data"])
+        sent = len(job.events)
+
+        if job.status == "done":
+            yield _sse("done", job.result)
+            return
+        if job.status == "failed":
+            yield _sse("failed", {"error": job.error})
+            return
+        if time.monotonic() >= deadline:
+            yield _sse("timeout", {"job_id": str(job_id)})
+            return
+        await asyncio.sleep(settings.QUIZ_JOB_POLL_INTERVAL_SECONDS)
+
+
+async def stream_submission(prepared: PreparedSubmission) -> AsyncIterator[str]:
+    """
+    Проверка квиза прямо в запросе: события отдаются клиенту по мере появления,
+    без записи в БД. Если клиент отключился, проверка отменяется.
+    """
+    queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+
+    async def on_event(kind: str, data: dict) -> None:
+        await queue.put((kind, data))
+
+    task = asyncio.create_task(grade_submission(prepared, on_event))
+    task.add_done_callback(lambda _: queue.put_nowait(("", {})))
+    try:
+        while True:
+            kind, data = await queue.get()
+            if kind:
+                yield _sse(kind, data)
+                continue
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.exception("Quiz stream failed")
+                yield _sse("failed", {"error": f"{e.__class__.__name__}: {e}"})
+            else:
+                yield _sse("done", result.model_dump(mode="json"))
+            return
+    finally:
+        task.cancel()
@@ -0,0 +1,128 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.models import QuizSnapshot
+
+
+settings = get_settings()
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotQuestion:
+    type: int
+    description: str
+    explanation: str
+    correct_answer_ids: frozenset[UUID]
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotAIQuestion:
+    description: str
+    explanation: str
+
+
+@dataclass(frozen=True, slots=True)
+class QuizAnswerKey:
+    """
+    Все, что нужно для проверки квиза без повторных запросов к БД.
+    gen_questions: id сгенерированного вопроса на фронте (gen_0, gen_1, ...) -> промпт.
+    """
+    questions: dict[UUID, SnapshotQuestion] = field(default_factory=dict)
+    ai_questions: dict[UUID, SnapshotAIQuestion] = field(default_factory=dict)
+    gen_questions: dict[str, str] = field(default_factory=dict)
+
+
+def build_answer_key(questions, ai_questions, gen_questions: list[str]) -> QuizAnswerKey:
+    """
+    Собирает ключ из выданных вопросов: подходят и строки ORM,
+    и записи из кэша пулов (у обоих есть answers с is_correct).
+    """
+    return QuizAnswerKey(
+        questions={
+            question.id: SnapshotQuestion(
+                type=question.type,
+                description=question.description,
+                explanation=question.explanation,
+                correct_answer_ids=frozenset(
+                    answer.id for answer in question.answers if answer.is_correct
+                ),
+            )
+            for question in questions
+        },
+        ai_questions={
+            question.id: SnapshotAIQuestion(
+                description=question.description,
+                explanation=question.explanation,
+            )
+            for question in ai_questions
+        },
+        gen_questions={f"gen_{idx}": text for idx, text in enumerate(gen_questions)},
+    )
+
+
+def _dump(key: QuizAnswerKey) -> dict:
+    return {
+        "questions": {
+            str(question_id): {
+                "type": question.type,
+                "description": question.description,
+                "explanation": question.explanation,
+                "correct_answer_ids": [str(answer_id) for answer_id in question.correct_answer_ids],
+            }
+            for question_id, question in key.questions.items()
+        },
+        "ai_questions": {
+            str(question_id): {
+                "description": question.description,
+                "explanation": question.explanation,
+            }
+            for question_id, question in key.ai_questions.items()
+        },
+        "gen_questions": key.gen_questions,
+    }
+
+
+def _load(payload: dict) -> QuizAnswerKey:
+    return QuizAnswerKey(
+        questions={
+            UUID(question_id): SnapshotQuestion(
+                type=question["type"],
+                description=question["description"],
+                explanation=question["explanation"],
+                correct_answer_ids=frozenset(UUID(answer_id) for answer_id in question["correct_answer_ids"]),
+            )
+            for question_id, question in payload["questions"].items()
+        },
+        ai_questions={
+            UUID(question_id): SnapshotAIQuestion(**question)
+            for question_id, question in payload["ai_questions"].items()
+        },
+        gen_questions=payload["gen_questions"],
+    )
+
+
+async def save_snapshot(session: AsyncSession, key: QuizAnswerKey) -> UUID:
+    snapshot = QuizSnapshot(
+        payload=_dump(key),
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.QUIZ_SNAPSHOT_TTL_SECONDS),
+    )
+    session.add(snapshot)
+    await session.commit()
+    return snapshot.id
+
+
+async def load_snapshot(session: AsyncSession, quiz_id: UUID) -> QuizAnswerKey | None:
+    """
+    None, если снимка нет или он устарел.
+    """
+    query = select(QuizSnapshot.payload).where(
+        QuizSnapshot.id == quiz_id,
+        QuizSnapshot.expires_at > datetime.now(timezone.utc),
+    )
+    payload = await session.scalar(query)
+    return None if payload is None else _load(payload)
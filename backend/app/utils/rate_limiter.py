@@ -0,0 +1,266 @@
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import AsyncIterator, Mapping
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from app.config import get_settings
+from app.database.connection import session_scope
+from app.database.models import AIRateLimitState
+
+
+logger = getLogger(__name__)
+settings = get_settings()
+
+_duration_part = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_duration_units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: str | None) -> float | None:
+    """
+    Длительность из заголовков x-ratelimit-reset-* ("1s", "6m0s", "20ms") в секундах.
+    """
+    if not value:
+        return None
+    parts = _duration_part.findall(value)
+    if not parts:
+        return float(value) if value.replace(".", "", 1).isdigit() else None
+    return sum(float(number) * _duration_units[unit] for number, unit in parts)
+
+
+def estimate_tokens(payload: dict) -> int:
+    """
+    Грубая оценка токенов запроса: ~3 символа на токен плюс ожидаемый ответ.
+    """
+    prompt = sum(len(str(message.get("content", ""))) for message in payload.get("messages", []))
+    output = payload.get("max_tokens") or settings.AI_RATE_EXPECTED_OUTPUT_TOKENS
+    return prompt // 3 + output
+
+
+@dataclass(slots=True)
+class Bucket:
+    requests: float
+    tokens: float
+    updated_at: float
+    blocked_until: float = 0.0
+
+    def take(self, now: float, cost: int, rpm: float, tpm: float) -> float:
+        """
+        Пополняет бакет и списывает запрос стоимостью cost токенов.
+        Возвращает 0, если списано, иначе сколько секунд подождать.
+        """
+        return self.reserve(now, cost, rpm, tpm, 1)[1]
+
+    def reserve(self, now: float, cost: int, rpm: float, tpm: float,
+                count: int) -> tuple[int, float]:
+        """
+        Пополняет бакет и списывает до count запросов стоимостью cost.
+        Возвращает, сколько запросов списано, и сколько ждать, если ни одного.
+        """
+        if self.blocked_until > now:
+            return 0, self.blocked_until - now
+        elapsed = max(now - self.updated_at, 0.0)
+        self.requests = min(rpm, self.requests + elapsed * rpm / 60)
+        self.tokens = min(tpm, self.tokens + elapsed * tpm / 60)
+        self.updated_at = now
+        # Запрос дороже всего бакета пропускается при полном бакете
+        cost = min(cost, tpm)
+        granted = min(count, int(self.requests), int(self.tokens // cost) if cost > 0 else count)
+        if granted >= 1:
+            self.requests -= granted
+            self.tokens -= granted * cost
+            return granted, 0.0
+        return 0, max((1 - self.requests) * 60 / rpm, (cost - self.tokens) * 60 / tpm, 0.01)
+
+
+class AdaptiveRateLimiter:
+    """
+    Ограничитель запросов к модели: token bucket по RPM и TPM (общий для
+    воркеров через таблицу AIRateLimit или локальный) и лимит одновременных
+    запросов, который подстраивается по AIMD: +1/limit за успешный ответ,
+    вдвое меньше после 429.
+    Из общего бакета воркер берет сразу до batch запросов (не больше, чем
+    ждут в очереди) и тратит их локально reserve_seconds: строка блокируется
+    раз на пачку, а не на вызов. Остаток возвращается со следующей пачкой.
+    """
+
+    def __init__(self, rpm: float, tpm: float, min_concurrency: int,
+                 max_concurrency: int, shared: bool, batch: int = 1,
+                 reserve_seconds: float = 1.0, name: str = "openai"):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.shared = shared
+        self.batch = max(batch, 1)
+        self.reserve_seconds = reserve_seconds
+        self.name = name
+        self.limit = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._local = Bucket(requests=rpm, tokens=tpm, updated_at=time.time())
+        self._reserve_lock = asyncio.Lock()
+        self._reserved_requests = 0
+        self._reserved_tokens = 0
+        self._reserved_until = 0.0
+        self._waiting = 0
+        self._decreased_at = 0.0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+        self.reservations = 0
+
+    async def _reserve_shared(self, cost: int) -> float:
+        now = datetime.now(timezone.utc)
+        # Неизрасходованный резерв возвращается в общий бакет в той же транзакции
+        refund_requests, refund_tokens = self._reserved_requests, self._reserved_tokens
+        self._reserved_requests = self._reserved_tokens = 0
+        # Пачка не больше, чем запросов ждет сейчас: при малой нагрузке по одному
+        count = max(min(self.batch, self._waiting), 1)
+        async with session_scope() as session:
+            await session.execute(
+                insert(AIRateLimitState)
+                .values(name=self.name, requests=self.rpm, tokens=self.tpm, updated_at=now)
+                .on_conflict_do_nothing(index_elements=[AIRateLimitState.name])
+            )
+            state = await session.scalar(
+                select(AIRateLimitState).where(AIRateLimitState.name == self.name).with_for_update()
+            )
+            bucket = Bucket(
+                requests=state.requests,
+                tokens=state.tokens,
+                updated_at=state.updated_at.timestamp(),
+                blocked_until=state.blocked_until.timestamp() if state.blocked_until else 0.0,
+            )
+            # Пополнение в reserve обрезает бакет по rpm/tpm
+            bucket.requests += refund_requests
+            bucket.tokens += refund_tokens
+            granted, wait = bucket.reserve(now.timestamp(), cost, self.rpm, self.tpm, count)
+            state.requests = bucket.requests
+            state.tokens = bucket.tokens
+            state.updated_at = now
+            await session.commit()
+        self.reservations += 1
+        self._local.blocked_until = max(self._local.blocked_until, bucket.blocked_until)
+        if granted:
+            # Первый запрос пачки уходит сразу, остальные ждут в резерве
+            self._reserved_requests = granted - 1
+            self._reserved_tokens = (granted - 1) * min(cost, self.tpm)
+            self._reserved_until = time.monotonic() + self.reserve_seconds
+        return wait
+
+    def _take_reserved(self, cost: int) -> bool:
+        if time.monotonic() >= self._reserved_until:
+            return False
+        cost = min(cost, self.tpm)
+        if self._reserved_requests < 1 or self._reserved_tokens < cost:
+            return False
+        self._reserved_requests -= 1
+        self._reserved_tokens -= cost
+        return True
+
+    async def _take(self, cost: int) -> float:
+        if self.shared:
+            self._waiting += 1
+            try:
+                async with self._reserve_lock:
+                    if (blocked := self._local.blocked_until - time.time()) > 0:
+                        return blocked
+                    if self._take_reserved(cost):
+                        return 0.0
+                    try:
+                        return await self._reserve_shared(cost)
+                    except Exception:
+                        logger.exception("Shared rate limit state unavailable, using local bucket")
+            finally:
+                self._waiting -= 1
+        return self._local.take(time.time(), cost, self.rpm, self.tpm)
+
+    async def _block(self, seconds: float) -> None:
+        until = time.time() + seconds
+        self._local.blocked_until = max(self._local.blocked_until, until)
+        # Резерв набран до паузы провайдера: после нее берем заново
+        self._reserved_until = 0.0
+        if not self.shared:
+            return
+        try:
+            async with session_scope() as session:
+                state = await session.scalar(
+                    select(AIRateLimitState).where(AIRateLimitState.name == self.name).with_for_update()
+                )
+                blocked_until = datetime.fromtimestamp(until, timezone.utc)
+                if state is not None and (state.blocked_until is None or state.blocked_until < blocked_until):
+                    state.blocked_until = blocked_until
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to share rate limit pause")
+
+    @asynccontextmanager
+    async def slot(self, cost: int) -> AsyncIterator[None]:
+        """
+        Ждет места в лимите одновременных запросов и в бакете.
+        """
+        started = time.monotonic()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        try:
+            while (wait := await self._take(cost)) > 0:
+                self.throttled += 1
+                await asyncio.sleep(wait)
+            self.waited_seconds += time.monotonic() - started
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    async def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        """
+        Подстраивает лимит по статусу ответа и заголовкам x-ratelimit-*.
+        """
+        now = time.monotonic()
+        if status == 429:
+            # Одна волна 429 уменьшает лимит один раз
+            if now - self._decreased_at > 1:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._decreased_at = now
+            retry_after = parse_reset(headers.get("Retry-After")) or \
+                parse_reset(headers.get("x-ratelimit-reset-requests")) or 1.0
+            await self._block(retry_after)
+            return
+
+        if status < 500:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+        for kind in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    await self._block(reset)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self._in_flight,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited_seconds, 3),
+            "shared": self.shared,
+            "shared_reservations": self.reservations,
+        }
+
+
+rate_limiter = AdaptiveRateLimiter(
+    rpm=settings.AI_RATE_LIMIT_RPM,
+    tpm=settings.AI_RATE_LIMIT_TPM,
+    min_concurrency=settings.AI_RATE_LIMIT_MIN_CONCURRENCY,
+    max_concurrency=settings.AI_RATE_LIMIT_MAX_CONCURRENCY,
+    shared=settings.AI_RATE_LIMIT_SHARED,
+    batch=settings.AI_RATE_LIMIT_SHARED_BATCH,
+    reserve_seconds=settings.AI_RATE_LIMIT_SHARED_RESERVE_SECONDS,
+)
@@ -0,0 +1,139 @@
+import random
+from typing import Any, Sequence
+from uuid import UUID
+
+from sqlalchemy import Float, bindparam, func, true
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import Select
+
+
+# Во сколько раз точек-проб больше, чем нужно вопросов: часть проб
+# попадает в одну и ту же строку, и дубликаты отбрасываются
+OVERSAMPLING = 2
+
+# Сколько раз добираем недостающее новыми пробами, прежде чем взять
+# оставшиеся строки подряд (банк почти исчерпан)
+PROBE_ROUNDS = 4
+
+
+def _probe_query(model, topics: Select, points: list[float]):
+    """
+    Для каждой случайной точки p и каждой темы берет первую строку темы
+    с random_key >= p: индексный поиск по (topic_id, random_key) на пару.
+    """
+    probe_points = (
+        func.unnest(bindparam("points", points, type_=ARRAY(Float)))
+        .table_valued("point")
+        .render_derived(name="probe_points")
+    )
+    probe_topics = topics.subquery("probe_topics")
+    topic_id = probe_topics.c[0]
+    probe = (
+        select(model.id, model.random_key)
+        .where(model.topic_id == topic_id, model.random_key >= probe_points.c.point)
+        .order_by(model.random_key)
+        .limit(1)
+        .lateral("probe")
+    )
+    return (
+        select(probe_points.c.point, probe.c.id, probe.c.random_key)
+        .select_from(probe_points)
+        .join(probe_topics, true())
+        .join(probe, true())
+    )
+
+
+def _first_query(model, topics: Select):
+    """
+    Строка с наименьшим random_key среди тем: куда попадают точки правее
+    максимального ключа, ключи замкнуты в кольцо.
+    """
+    probe_topics = topics.subquery("probe_topics")
+    head = (
+        select(model.id, model.random_key)
+        .where(model.topic_id == probe_topics.c[0])
+        .order_by(model.random_key)
+        .limit(1)
+        .lateral("head")
+    )
+    return (
+        select(head.c.id)
+        .select_from(probe_topics)
+        .join(head, true())
+        .order_by(head.c.random_key)
+        .limit(1)
+    )
+
+
+async def _probe(session: AsyncSession, model, topics: Select,
+                 points: list[float]) -> list[UUID]:
+    best: dict[float, tuple[float, UUID]] = {}
+    for point, row_id, key in (await session.execute(_probe_query(model, topics, points))).all():
+        if point not in best or key < best[point][0]:
+            best[point] = (key, row_id)
+
+    wrapped = None
+    if len(best) < len(points):
+        wrapped = await session.scalar(_first_query(model, topics))
+        if wrapped is None:
+            return []
+    return [best[point][1] if point in best else wrapped for point in points]
+
+
+async def sample_ids(session: AsyncSession, model, topics: Select,
+                     count: int) -> list[UUID]:
+    """
+    Выбирает до count случайных id строк model из тем, которые отдает
+    запрос topics (select одного столбца с id темы).
+    Стоимость O(count * тем) индексных поисков по (topic_id, random_key)
+    вместо полного скана и сортировки при ORDER BY random().
+    """
+    if count <= 0:
+        return []
+
+    ids: dict[UUID, None] = {}
+    for _ in range(PROBE_ROUNDS):
+        missing = count - len(ids)
+        points = [random.random() for _ in range(missing * OVERSAMPLING)]
+        found = await _probe(session, model, topics, points)
+        if not found:
+            return []
+        for row_id in found:
+            if len(ids) == count:
+                break
+            ids.setdefault(row_id)
+        if len(ids) == count:
+            break
+
+    if len(ids) < count:
+        # В маленьком банке пробы раз за разом попадают в уже взятые строки:
+        # добираем подряд от случайной точки по кольцу ключей
+        start = random.random()
+        query = (
+            select(model.id)
+            .where(model.topic_id.in_(topics), model.id.notin_(list(ids)))
+            .order_by(model.random_key < start, model.random_key)
+            .limit(count - len(ids))
+        )
+        ids.update(dict.fromkeys((await session.scalars(query)).all()))
+
+    result = list(ids)
+    random.shuffle(result)
+    return result
+
+
+async def sample_rows(session: AsyncSession, model, topics: Select,
+                      count: int, options: Sequence[Any] = ()) -> list:
+    """
+    То же, что sample_ids, но возвращает сами строки в случайном порядке.
+    """
+    ids = await sample_ids(session, model, topics, count)
+    if not ids:
+        return []
+
+    query = select(model).options(*options).where(model.id.in_(ids))
+    result = await session.scalars(query)
+    rows = {row.id: row for row in result.all()}
+    return [rows[row_id] for row_id in ids if row_id in rows]
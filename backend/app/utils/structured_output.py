@@ -0,0 +1,88 @@
+import re
+from typing import TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from app.config import get_settings
+
+
+settings = get_settings()
+
+Model = TypeVar("Model", bound=BaseModel)
+
+_fence = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+# Ограничения, которые strict-режим провайдера отклоняет с 400; их
+# по-прежнему проверяет pydantic при разборе ответа
+UNSUPPORTED_KEYWORDS = frozenset({
+    "minLength", "maxLength", "pattern", "format",
+    "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "multipleOf",
+    "minItems", "maxItems", "uniqueItems", "minProperties", "maxProperties",
+})
+
+
+def _strict(schema: dict) -> dict:
+    """
+    Strict-режим провайдера требует все поля в required у каждого объекта
+    и не принимает ограничения из UNSUPPORTED_KEYWORDS.
+    """
+    for keyword in UNSUPPORTED_KEYWORDS & schema.keys():
+        del schema[keyword]
+    if schema.get("type") == "object":
+        schema["required"] = list(schema.get("properties", {}))
+    for key, value in schema.items():
+        if key in ("properties", "$defs"):
+            # Ключи здесь - имена полей и моделей, а не ключевые слова схемы
+            for item in value.values():
+                _strict(item)
+        elif isinstance(value, dict):
+            _strict(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    _strict(item)
+    return schema
+
+
+def response_format(model: type[BaseModel]) -> dict:
+    """
+    Поля payload, которые просят у модели JSON строго по схеме model.
+    Пусто, если AI_STRUCTURED_OUTPUT выключен (провайдер не умеет json_schema).
+    """
+    if not settings.AI_STRUCTURED_OUTPUT:
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": model.__name__,
+                "strict": True,
+                "schema": _strict(model.model_json_schema()),
+            },
+        },
+    }
+
+
+def parse_output(text: str, model: type[Model]) -> tuple[Model, bool]:
+    """
+    Разбирает ответ модели в model. Второй элемент - пришлось ли чинить
+    ответ: снимать ```json или вырезать объект из текста вокруг него.
+    Бросает ValueError, если ответ не подходит под схему.
+    """
+    try:
+        return model.model_validate_json(text), False
+    except ValidationError:
+        pass
+
+    candidates = [_fence.sub("", text)]
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+    error = None
+    for candidate in candidates:
+        try:
+            return model.model_validate_json(candidate), True
+        except ValidationError as e:
+            error = e
+    raise ValueError(f"response does not match {model.__name__}: {error}")
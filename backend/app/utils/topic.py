@@ -6,6 +6,8 @@ from app.database.models import User, Topic, Chapter
 from app.schemas import TopicCreateForm, ChapterCreateForm
 from sqlalchemy.future import select
 
+from app.utils.question_cache import invalidate_topics
+
 
 async def add_topic(topic: TopicCreateForm, session: AsyncSession):
     topic = topic.model_dump()
@@ -17,6 +19,8 @@ async def add_topic(topic: TopicCreateForm, session: AsyncSession):
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    # Пул раздела кэширует список его тем: новая тема должна в него попасть
+    await invalidate_topics(session, topic_data.id)
     return True
 
 
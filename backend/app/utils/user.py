@@ -3,6 +3,7 @@ from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import exc, select
@@ -86,6 +87,36 @@ async def get_current_user(
     return user
 
 
+_optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl=f"{get_settings().PATH_PREFIX}/user/token", auto_error=False
+)
+
+
+async def get_optional_user(
+    token: Annotated[str | None, Depends(_optional_oauth2_scheme)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    settings: Annotated[DefaultSettings, Depends(get_settings)],
+) -> User | None:
+    if token is None:
+        return None
+    try:
+        return await get_current_user(token, session, settings)
+    except HTTPException:
+        return None
+
+
+async def get_admin_user(
+    current_user: Annotated[User, Depends(get_current_user)],
+    settings: Annotated[DefaultSettings, Depends(get_settings)],
+) -> User:
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+        )
+    return current_user
+
+
 async def register_user_via_google(session: AsyncSession, user_info: str):
     user = await get_user_by_email(session, user_info.get("email"))
     if user is None:
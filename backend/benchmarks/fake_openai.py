@@ -0,0 +1,240 @@
+"""
+Локальная заглушка chat completions для нагрузочных тестов без сети.
+
+Понимает запросы бэкенда: проверку ответа (score/feedback), пакетную
+проверку (results, в том числе только оценки), генерацию вопросов (questions) и рекомендации (html),
+в том числе в режиме stream. Тип запроса определяется по имени схемы в
+response_format, готовые ответы можно подложить файлом --payloads. Задержка ответа - логнормальная с заданной
+медианой и разбросом, часть запросов отвечает 429 или 500.
+
+Запуск из каталога backend:
+    python -m benchmarks.fake_openai --port 8090 --latency-median 0.8 --error-rate 0.02
+    python -m benchmarks.fake_openai --payloads payloads.json
+
+и в .env бэкенда:
+    AI_URL=http://127.0.0.1:8090/v1/chat/completions
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass(slots=True)
+class Profile:
+    latency_median: float = 0.8
+    latency_sigma: float = 0.5
+    token_delay: float = 0.02
+    rate_limit_rate: float = 0.0
+    error_rate: float = 0.0
+    score: int | None = None
+    payloads: dict = field(default_factory=dict)
+
+    def latency(self) -> float:
+        return random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+
+profile = Profile()
+app = FastAPI(title="Fake chat completions")
+
+_count_pattern = re.compile(r"Сгенерируй (\d+)")
+_numbered_pattern = re.compile(r"^\d+\. Вопрос:", re.MULTILINE)
+
+
+def _score() -> int:
+    return profile.score if profile.score is not None else random.choice((0, 1, 2))
+
+
+def _requested(payload: dict) -> int:
+    """
+    Сколько вопросов просят сгенерировать.
+    """
+    match = _count_pattern.search(payload["messages"][-1]["content"])
+    return int(match.group(1)) if match else 5
+
+
+def _items(payload: dict) -> int:
+    """
+    Сколько ответов в пакетной проверке.
+    """
+    return len(_numbered_pattern.findall(payload["messages"][-1]["content"])) or 1
+
+
+def _generated(payload: dict) -> dict:
+    return {"questions": [
+        {"description": f"Сгенерированный вопрос {idx + 1}: {uuid4().hex[:8]}?"}
+        for idx in range(_requested(payload))
+    ]}
+
+
+def _check(payload: dict) -> dict:
+    return {"score": _score(), "feedback": "<p>Проверено заглушкой.</p>"}
+
+
+def _check_batch(payload: dict) -> dict:
+    return {"results": [_check(payload) for _ in range(_items(payload))]}
+
+
+def _score_batch(payload: dict) -> dict:
+    return {"results": [{"score": _score()} for _ in range(_items(payload))]}
+
+
+def _feedback(payload: dict) -> str:
+    return "<h3>Рекомендации</h3>" + "".join(
+        f"<p>Повторите тему {idx + 1}: определения, примеры и типичные ошибки.</p>"
+        for idx in range(8)
+    )
+
+
+# Ответы по имени схемы из response_format.json_schema.name (app/schemas/ai.py);
+# FEEDBACK - запрос без схемы, рекомендации в html
+FEEDBACK = "feedback"
+_builders = {
+    "AICheckResult": _check,
+    "AICheckBatchResult": _check_batch,
+    "AIScoreBatchResult": _score_batch,
+    "AIGeneratedQuestions": _generated,
+    FEEDBACK: _feedback,
+}
+
+
+def _kind(payload: dict) -> str:
+    """
+    Тип запроса: имя схемы, а без нее (AI_STRUCTURED_OUTPUT=false) - по тексту
+    системного промпта.
+    """
+    response_format = payload.get("response_format") or {}
+    name = (response_format.get("json_schema") or {}).get("name")
+    if name:
+        return name
+    system = payload["messages"][0]["content"]
+    if "questions" in system:
+        return "AIGeneratedQuestions"
+    if "results" in system:
+        return "AICheckBatchResult" if "feedback" in system else "AIScoreBatchResult"
+    if "score" in system:
+        return "AICheckResult"
+    return FEEDBACK
+
+
+def _content(payload: dict) -> str:
+    """
+    Канонический ответ на запрос: тот же формат, что у настоящей модели,
+    или заготовка из --payloads для этого типа.
+    """
+    kind = _kind(payload)
+    if kind in profile.payloads:
+        content = profile.payloads[kind]
+    else:
+        content = _builders.get(kind, _feedback)(payload)
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+
+def _usage(payload: dict, content: str) -> dict:
+    prompt = sum(len(str(message["content"])) for message in payload["messages"]) // 3
+    completion = len(content) // 3
+    return {"prompt_tokens": prompt, "completion_tokens": completion,
+            "total_tokens": prompt + completion}
+
+
+def _error() -> JSONResponse | None:
+    roll = random.random()
+    if roll < profile.rate_limit_rate:
+        return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests"}},
+                            status_code=429, headers={"Retry-After": "1"})
+    if roll < profile.rate_limit_rate + profile.error_rate:
+        return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}},
+                            status_code=500)
+    return None
+
+
+async def _stream(payload: dict, content: str, completion_id: str):
+    for start in range(0, len(content), 12):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "delta": {"content": content[start:start + 12]},
+                         "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(profile.token_delay)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "usage": _usage(payload, content),
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    await asyncio.sleep(profile.latency())
+    error = _error()
+    if error is not None:
+        return error
+
+    content = _content(payload)
+    if payload.get("max_tokens"):
+        # Как у провайдера: ответ обрывается на max_tokens, даже посреди JSON
+        content = content[:payload["max_tokens"] * 3]
+    completion_id = f"chatcmpl-{uuid4().hex}"
+    if payload.get("stream"):
+        return StreamingResponse(_stream(payload, content, completion_id),
+                                 media_type="text/event-stream")
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+        "usage": _usage(payload, content),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-median", type=float, default=profile.latency_median,
+                        help="медиана задержки до первого байта, секунды")
+    parser.add_argument("--latency-sigma", type=float, default=profile.latency_sigma,
+                        help="разброс логнормальной задержки")
+    parser.add_argument("--token-delay", type=float, default=profile.token_delay,
+                        help="пауза между кусками в режиме stream, секунды")
+    parser.add_argument("--rate-limit-rate", type=float, default=profile.rate_limit_rate,
+                        help="доля ответов 429")
+    parser.add_argument("--error-rate", type=float, default=profile.error_rate,
+                        help="доля ответов 500")
+    parser.add_argument("--score", type=int, choices=(0, 1, 2), default=None,
+                        help="фиксированная оценка вместо случайной")
+    parser.add_argument("--payloads", default=None,
+                        help="JSON-файл с готовыми ответами: имя схемы (AICheckResult, "
+                             "AICheckBatchResult, AIScoreBatchResult, AIGeneratedQuestions) "
+                             "или feedback -> объект или строка, отдается как есть")
+    args = parser.parse_args()
+
+    profile.latency_median = args.latency_median
+    profile.latency_sigma = args.latency_sigma
+    profile.token_delay = args.token_delay
+    profile.rate_limit_rate = args.rate_limit_rate
+    profile.error_rate = args.error_rate
+    profile.score = args.score
+    if args.payloads:
+        with open(args.payloads, encoding="utf-8") as file:
+            profile.payloads = json.load(file)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
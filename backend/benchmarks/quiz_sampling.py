@@ -0,0 +1,107 @@
+"""
+Бенчмарк выборки вопросов для квиза: ORDER BY random() против random_key.
+
+Создает временную БД (как tests/conftest.py), накатывает миграции и
+постепенно наполняет одну тему вопросами от 1k до 1M, замеряя обе выборки.
+
+Запуск из каталога backend (нужен доступный Postgres из .env):
+    python -m benchmarks.quiz_sampling --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+from alembic.command import upgrade
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy_utils import create_database, drop_database
+
+from app.config import get_settings
+from app.database.models import Question, Topic
+from app.utils.sampling import sample_ids
+from tests.utils import make_alembic_config
+
+
+async def seed(session: AsyncSession, topic_id, rows: int) -> None:
+    await session.execute(
+        text(
+            'INSERT INTO "Question" (id, description, type, explanation, topic_id) '
+            "SELECT gen_random_uuid(), 'question ' || g, 0, '', :topic_id "
+            "FROM generate_series(1, :rows) AS g"
+        ),
+        {"topic_id": topic_id, "rows": rows},
+    )
+    await session.commit()
+    await session.execute(text('ANALYZE "Question"'))
+
+
+async def measure(session: AsyncSession, sampler, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await sampler()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run(sizes: list[int], count: int, repeats: int, database_uri: str) -> None:
+    engine = create_async_engine(database_uri)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    topic_id = uuid4()
+
+    async with session_maker() as session:
+        await session.execute(text('INSERT INTO "Chapter" (id, name) VALUES (:id, :name)'),
+                              {"id": topic_id, "name": "bench"})
+        await session.execute(text('INSERT INTO "Topic" (id, chapter_id, name) VALUES (:id, :id, :name)'),
+                              {"id": topic_id, "name": "bench"})
+        await session.commit()
+
+        async def order_by_random():
+            query = (select(Question.id).where(Question.topic_id == topic_id)
+                     .order_by(func.random()).limit(count))
+            return (await session.scalars(query)).all()
+
+        async def random_key():
+            return await sample_ids(session, Question, select(Topic.id).where(Topic.id == topic_id), count)
+
+        print(f"{'rows':>10} | {'ORDER BY random(), ms':>22} | {'random_key, ms':>15}")
+        seeded = 0
+        for size in sorted(sizes):
+            await seed(session, topic_id, size - seeded)
+            seeded = size
+            await random_key()
+            baseline = await measure(session, order_by_random, repeats)
+            sampled = await measure(session, random_key, repeats)
+            print(f"{size:>10} | {baseline:>22.2f} | {sampled:>15.2f}")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--count", type=int, default=20, help="Вопросов в квизе")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.POSTGRES_DB = ".".join([uuid4().hex, "bench"])
+    create_database(settings.database_uri_sync)
+    try:
+        cmd_options = SimpleNamespace(config="app/database/", name="alembic",
+                                      pg_url=settings.database_uri, raiseerr=False, x=None)
+        upgrade(make_alembic_config(cmd_options), "head")
+        asyncio.run(run(args.sizes, args.count, args.repeats, settings.database_uri))
+    finally:
+        drop_database(settings.database_uri_sync)
+
+
+if __name__ == "__main__":
+    main()
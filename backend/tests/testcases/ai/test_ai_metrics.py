@@ -0,0 +1,24 @@
+from app.utils.ai_metrics import LatencyHistogram
+
+
+class TestLatencyHistogram:
+    def test_buckets_are_cumulative(self):
+        """
+        Корзины накопительные, значение на границе попадает в эту корзину.
+        """
+        histogram = LatencyHistogram(buckets=(1, 5))
+        for seconds in (0.5, 1, 3, 10):
+            histogram.observe(seconds)
+        assert histogram.stats()["buckets"] == {"1": 2, "5": 3, "+Inf": 4}
+        assert histogram.count == 4
+
+    def test_quantiles(self):
+        """
+        Квантиль - верхняя граница корзины, в которую он попал.
+        """
+        histogram = LatencyHistogram(buckets=(1, 5))
+        for seconds in (0.1, 0.2, 0.3, 4):
+            histogram.observe(seconds)
+        assert histogram.quantile(0.5) == 1
+        assert histogram.quantile(0.95) == 5
+        assert LatencyHistogram().quantile(0.5) is None
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from app.utils import ai_client, ai_generation
+from app.utils.ai_client import AIUnavailableError, CircuitBreaker, Hedger, ai_request
+from app.utils.ai_metrics import CallRecord
+from app.utils.rate_limiter import AdaptiveRateLimiter
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    """
+    Локальный сервер, отвечающий статусами из очереди statuses, затем 200.
+    Элемент очереди - статус или (статус, заголовки[, задержка]).
+    """
+    statuses: list[int | tuple] = []
+    calls: list[int] = []
+
+    async def handler(request: web.Request) -> web.Response:
+        status, headers, delay = statuses.pop(0) if statuses else 200, {}, 0
+        if isinstance(status, tuple):
+            status, headers, delay = (*status, 0)[:3]
+        calls.append(status)
+        await asyncio.sleep(delay)
+        return web.json_response({"status": status}, status=status, headers=headers)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/v1/chat/completions", statuses, calls
+    await ai_client.close_ai_client()
+    await runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    settings = ai_client.settings
+    monkeypatch.setattr(settings, "AI_RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", False)
+    monkeypatch.setattr(settings, "AI_RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "AI_RETRY_BASE_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "AI_REQUEST_BUDGET_SECONDS", 5)
+    monkeypatch.setattr(ai_client, "breaker", CircuitBreaker(
+        window=30, min_requests=100, failure_rate=0.5, open_seconds=30))
+
+
+class TestAIRequest:
+    @pytest.mark.asyncio
+    async def test_retries_retryable_status(self, upstream):
+        """
+        На 503 запрос повторяется, вызывающий код получает следующий успешный ответ.
+        """
+        url, statuses, calls = upstream
+        statuses.extend([503, 429])
+        async with ai_request(url, {}, {}) as resp:
+            assert resp.status == 200
+        assert calls == [503, 429, 200]
+
+    @pytest.mark.asyncio
+    async def test_last_response_after_attempts(self, upstream):
+        """
+        После AI_RETRY_ATTEMPTS неуспешных попыток отдается последний ответ как есть.
+        """
+        url, statuses, calls = upstream
+        statuses.extend([500, 502, 503, 504])
+        async with ai_request(url, {}, {}) as resp:
+            assert resp.status == 503
+        assert calls == [500, 502, 503]
+
+    @pytest.mark.asyncio
+    async def test_retry_after_header(self, upstream):
+        """
+        Пауза перед повтором берется из Retry-After.
+        """
+        url, statuses, calls = upstream
+        statuses.append((429, {"Retry-After": "1"}))
+        started = time.monotonic()
+        async with ai_request(url, {}, {}) as resp:
+            assert resp.status == 200
+        assert time.monotonic() - started >= 1
+
+    @pytest.mark.asyncio
+    async def test_budget_exhausted(self, upstream, monkeypatch):
+        """
+        Если пауза не влезает в AI_REQUEST_BUDGET_SECONDS, запрос не повторяется.
+        """
+        monkeypatch.setattr(ai_client.settings, "AI_REQUEST_BUDGET_SECONDS", 2)
+        url, statuses, calls = upstream
+        statuses.append((429, {"Retry-After": "10"}))
+        with pytest.raises(AIUnavailableError):
+            async with ai_request(url, {}, {}):
+                pass
+        assert calls == [429]
+
+    @pytest.mark.asyncio
+    async def test_network_errors(self, upstream):
+        """
+        Сетевые ошибки повторяются и после последней попытки пробрасываются.
+        """
+        with pytest.raises(aiohttp.ClientError):
+            async with ai_request("http://127.0.0.1:1/v1/chat/completions", {}, {}):
+                pass
+        assert ai_client.breaker.stats()["window_failures"] == 3
+
+    @pytest.mark.asyncio
+    async def test_open_breaker(self, upstream):
+        """
+        При открытом breaker запрос к модели не отправляется.
+        """
+        url, statuses, calls = upstream
+        for _ in range(100):
+            ai_client.breaker.record(False)
+        with pytest.raises(AIUnavailableError):
+            async with ai_request(url, {}, {}):
+                pass
+        assert calls == []
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_slow_primary_sampled(self, upstream, monkeypatch):
+        """
+        Медленный основной запрос дублируется; после победы дубля в замеры
+        попадает время, которое основной успел прождать.
+        """
+        monkeypatch.setattr(ai_client.settings, "AI_HEDGE_ENABLED", True)
+        hedger = Hedger(percentile=0.95, min_samples=100, default_delay=0.1, min_delay=0.1)
+        monkeypatch.setattr(ai_client, "hedger", hedger)
+        url, statuses, calls = upstream
+        statuses.append((200, {}, 0.5))
+        async with ai_request(url, {}, {}) as resp:
+            assert resp.status == 200
+        assert hedger.stats()["hedge_wins"] == 1
+        assert len(hedger._latencies) == 1 and hedger._latencies[0] >= 0.1
+
+
+class TestRateLimited:
+    @pytest.mark.asyncio
+    async def test_budget_limits_only_waiting(self, monkeypatch):
+        """
+        Бюджет ограничивает ожидание слота, а таймаут самого запроса
+        не превращается в AIUnavailableError.
+        """
+        monkeypatch.setattr(ai_client.settings, "AI_RATE_LIMIT_ENABLED", True)
+        limiter = AdaptiveRateLimiter(rpm=600, tpm=60000, min_concurrency=1,
+                                      max_concurrency=1, shared=False)
+        monkeypatch.setattr(ai_client, "rate_limiter", limiter)
+
+        async with limiter.slot(1):
+            with pytest.raises(AIUnavailableError):
+                async with ai_client._rate_limited(1, time.monotonic() + 0.05):
+                    pass
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with ai_client._rate_limited(1, time.monotonic() + 0.05):
+                await asyncio.sleep(0.1)
+                raise asyncio.TimeoutError
+        assert limiter.stats()["in_flight"] == 0
+
+
+class TestBatchGrading:
+    @pytest.mark.asyncio
+    async def test_status_error_not_split(self, upstream, monkeypatch):
+        """
+        После неуспешного статуса пакет не разбивается на отдельные запросы.
+        """
+        url, statuses, calls = upstream
+        monkeypatch.setattr(ai_generation, "ai_url", url)
+        statuses.extend([503] * 10)
+        results = await ai_generation._ai_check_batch_uncached([("a", "b"), ("c", "d")])
+        assert results == [{"score": 0, "feedback": "check_error, status: 503"}] * 2
+        assert calls == [503, 503, 503]
+
+
+class TestStreamCheck:
+    @pytest.mark.asyncio
+    async def test_closes_stream_and_estimates_usage(self, monkeypatch):
+        """
+        Fast-проверка закрывает поток сразу после результата, а без куска
+        с usage токены считаются по оценке, а не нулем.
+        """
+        closed = asyncio.Event()
+
+        async def handler(request: web.Request) -> web.StreamResponse:
+            resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await resp.prepare(request)
+            chunk = {"choices": [{"delta": {"content": '{"score": 2, "feedback": "верно"}'}}]}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                closed.set()
+                raise
+            return resp
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", handler)
+        runner = web.AppRunner(app, handler_cancellation=True)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(ai_generation, "ai_url", f"http://127.0.0.1:{port}/v1/chat/completions")
+        try:
+            payload = {"messages": [{"role": "user", "content": "x" * 300}], "max_tokens": 50}
+            call = CallRecord("check")
+            result = await ai_generation._stream_check(payload, call)
+            assert result == {"score": 2, "feedback": "верно"}
+            await asyncio.wait_for(closed.wait(), timeout=1)
+            assert call.usage == {"prompt_tokens": 100, "completion_tokens": 11}
+        finally:
+            await ai_client.close_ai_client()
+            await runner.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_malformed_stream_is_check_error(self, monkeypatch):
+        """
+        Битая строка в потоке проверки дает check_error, а не исключение.
+        """
+        async def handler(request: web.Request) -> web.StreamResponse:
+            resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await resp.prepare(request)
+            await resp.write(b'data: {"choices": [\n\n')
+            return resp
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(ai_generation, "ai_url", f"http://127.0.0.1:{port}/v1/chat/completions")
+        monkeypatch.setattr(ai_client.settings, "AI_GRADING_MODE", "fast")
+        try:
+            result = await ai_generation._ai_check_uncached("Вопрос", "Ответ")
+            assert result == {"score": 0, "feedback": "check_error, invalid response"}
+        finally:
+            await ai_client.close_ai_client()
+            await runner.cleanup()
@@ -0,0 +1,48 @@
+import contextvars
+from uuid import uuid4
+
+from app.utils.ai_usage import UsageTracker, bucket_start, current_ai_user
+
+
+def record_as(tracker: UsageTracker, user_id, requests: int, tokens: int) -> None:
+    def run():
+        current_ai_user.set(user_id)
+        tracker.record(requests, tokens)
+    contextvars.copy_context().run(run)
+
+
+class TestUsageTracker:
+    def test_bucket_start(self):
+        """
+        Начало корзины округляется вниз до размера корзины.
+        """
+        assert bucket_start(7250, 3600).timestamp() == 7200
+
+    def test_records_current_user(self):
+        """
+        Вызов записывается на пользователя из контекста, в текущую корзину.
+        """
+        tracker = UsageTracker(window=3600, bucket=60)
+        user_id = uuid4()
+        record_as(tracker, user_id, 1, 300)
+        record_as(tracker, user_id, 1, 200)
+        assert list(tracker._pending.values()) == [[2, 500]]
+        assert next(iter(tracker._pending))[0] == user_id
+
+    def test_skips_calls_without_user(self):
+        """
+        Фоновые вызовы без пользователя (пополнение пула) не учитываются.
+        """
+        tracker = UsageTracker(window=3600, bucket=60)
+        record_as(tracker, None, 1, 300)
+        assert tracker._pending == {}
+
+    def test_users_counted_separately(self):
+        """
+        У каждого пользователя свои счетчики.
+        """
+        tracker = UsageTracker(window=3600, bucket=60)
+        first, second = uuid4(), uuid4()
+        record_as(tracker, first, 1, 100)
+        record_as(tracker, second, 1, 900)
+        assert sorted(tokens for _, tokens in tracker._pending.values()) == [100, 900]
@@ -0,0 +1,52 @@
+from app.utils.ai_client import CircuitBreaker
+
+
+def make_breaker(open_seconds: float = 30) -> CircuitBreaker:
+    return CircuitBreaker(window=30, min_requests=4, failure_rate=0.5, open_seconds=open_seconds)
+
+
+class TestCircuitBreaker:
+    def test_stays_closed_below_min_requests(self):
+        """
+        Пока запросов меньше min_requests, breaker не открывается даже при ошибках.
+        """
+        breaker = make_breaker()
+        for _ in range(3):
+            breaker.record(False)
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_opens_on_failure_rate(self):
+        """
+        При доле ошибок не ниже failure_rate запросы отклоняются сразу.
+        """
+        breaker = make_breaker()
+        for ok in (True, True, False, False):
+            breaker.record(ok)
+        assert breaker.state == "open"
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+
+    def test_half_open_probe(self):
+        """
+        После open_seconds пропускается один пробный запрос; успех закрывает breaker.
+        """
+        breaker = make_breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record(False)
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        breaker.record(True)
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens(self):
+        """
+        Неуспешный пробный запрос снова открывает breaker.
+        """
+        breaker = make_breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record(False)
+        assert breaker.allow()
+        breaker.open_seconds = 30
+        breaker.record(False)
+        assert breaker.state == "open"
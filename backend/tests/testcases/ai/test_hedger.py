@@ -0,0 +1,42 @@
+from app.utils.ai_client import Hedger
+
+
+def make_hedger() -> Hedger:
+    return Hedger(percentile=0.9, min_samples=5, default_delay=2, min_delay=0.2)
+
+
+class TestHedger:
+    def test_default_delay_until_enough_samples(self):
+        """
+        Пока замеров меньше min_samples, дубль отправляется через default_delay.
+        """
+        hedger = make_hedger()
+        for _ in range(4):
+            hedger.observe(0.5)
+        assert hedger.delay() == 2
+
+    def test_delay_follows_percentile(self):
+        """
+        Задержка перед дублем - заданный перцентиль последних замеров.
+        """
+        hedger = make_hedger()
+        for idx in range(1, 11):
+            hedger.observe(idx / 10)
+        assert hedger.delay() == 1.0
+
+    def test_min_delay(self):
+        """
+        Быстрые ответы не опускают задержку ниже min_delay.
+        """
+        hedger = make_hedger()
+        for _ in range(10):
+            hedger.observe(0.01)
+        assert hedger.delay() == 0.2
+
+    def test_stats_hedge_rate(self):
+        """
+        В статистике доля продублированных запросов.
+        """
+        hedger = make_hedger()
+        hedger.requests, hedger.hedged = 20, 1
+        assert hedger.stats()["hedge_rate"] == 0.05
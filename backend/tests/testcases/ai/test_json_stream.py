@@ -0,0 +1,80 @@
+from app.utils.json_stream import CheckResultStream, JsonArrayStream
+
+
+def feed_by_char(text: str) -> list:
+    parser = JsonArrayStream()
+    items = []
+    for char in text:
+        items.extend(parser.feed(char))
+    return items
+
+
+class TestJsonArrayStream:
+    def test_objects_in_wrapper(self):
+        """
+        Элементы массива questions внутри ```json и объекта-обертки.
+        """
+        text = '```json\n{"questions": [{"description": "A"}, {"description": "B"}]}\n```'
+        assert feed_by_char(text) == [{"description": "A"}, {"description": "B"}]
+
+    def test_item_ready_before_stream_ends(self):
+        """
+        Объект отдается сразу после закрывающей скобки, не дожидаясь конца массива.
+        """
+        parser = JsonArrayStream()
+        assert parser.feed('{"questions": [{"description": "A"}') == [{"description": "A"}]
+        assert parser.feed(', {"description": "B"}]}') == [{"description": "B"}]
+
+    def test_brackets_and_quotes_inside_strings(self):
+        """
+        Скобки и экранированные кавычки внутри строк не ломают разбор.
+        """
+        text = r'{"questions": [{"description": "Что вернет f([1, {2}])? \"x\""}]}'
+        assert feed_by_char(text) == [{"description": 'Что вернет f([1, {2}])? "x"'}]
+
+    def test_truncated_tail(self):
+        """
+        Оборванный последний объект отбрасывается, готовые остаются.
+        """
+        text = '{"questions": [{"description": "A"}, {"descr'
+        assert feed_by_char(text) == [{"description": "A"}]
+
+    def test_string_items(self):
+        """
+        Массив строк вместо объектов тоже разбирается.
+        """
+        assert feed_by_char('{"questions": ["A", "B"]}') == ["A", "B"]
+
+
+class TestCheckResultStream:
+    def test_result_when_object_closed(self):
+        """
+        Результат отдается сразу после закрывающей скобки объекта.
+        """
+        parser = CheckResultStream(max_chars=100)
+        assert parser.feed('{"score": 2, "feedback": "Всё ') is None
+        assert parser.feed('верно!"}\n\n') == {"score": 2, "feedback": "Всё верно!"}
+
+    def test_stops_at_max_chars(self):
+        """
+        Длинный feedback обрезается до max_chars, не дожидаясь конца ответа.
+        """
+        parser = CheckResultStream(max_chars=10)
+        result = parser.feed('{"score": 1, "feedback": "Частично верно, но')
+        assert result == {"score": 1, "feedback": "Частично…"}
+
+    def test_truncated_by_max_tokens(self):
+        """
+        Из ответа, оборванного по max_tokens, достаются score и начало feedback.
+        """
+        parser = CheckResultStream(max_chars=100)
+        assert parser.feed('{"score": 0, "feedback": "Неверно: \\"x') is None
+        assert parser.finish() == {"score": 0, "feedback": 'Неверно: "x'}
+
+    def test_no_score(self):
+        """
+        Без score результата нет: вызывающий код повторит запрос.
+        """
+        parser = CheckResultStream(max_chars=100)
+        parser.feed('{"feedback": "Всё')
+        assert parser.finish() is None
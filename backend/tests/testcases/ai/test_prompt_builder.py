@@ -0,0 +1,38 @@
+from app.utils.prompt_builder import encode_quiz_results
+
+
+def results(right: int, wrong: int, length: int = 20) -> list[dict]:
+    return [{"question": f"верный {idx} " + "x" * length, "is_user_answer_right": True}
+            for idx in range(right)] + \
+           [{"question": f"неверный {idx} " + "x" * length, "is_user_answer_right": False}
+            for idx in range(wrong)]
+
+
+class TestEncodeQuizResults:
+    def test_compact_lines(self):
+        """
+        Одна строка на вопрос: сначала ошибки, пробелы схлопываются.
+        """
+        data = [
+            {"question": "Что такое  GIL?", "is_user_answer_right": True},
+            {"question": "Что такое\nMRO?", "is_user_answer_right": False},
+        ]
+        assert encode_quiz_results(data) == "- Что такое MRO?\n+ Что такое GIL?"
+
+    def test_fits_budget(self):
+        """
+        Большой квиз укладывается в бюджет, ошибки остаются в приоритете.
+        """
+        text = encode_quiz_results(results(right=200, wrong=200, length=300), token_budget=500)
+        assert len(text) <= 500 * 3 + 100
+        assert text.startswith("- неверный 0")
+        assert "вопросов с неверным ответом" in text
+        assert text.endswith("+ и еще 200 вопросов с верным ответом")
+
+    def test_long_questions_shortened(self):
+        """
+        Если не влезает, сначала укорачиваются сами вопросы.
+        """
+        text = encode_quiz_results(results(right=5, wrong=5, length=1000), token_budget=1000)
+        assert text.count("\n") == 9
+        assert "…" in text
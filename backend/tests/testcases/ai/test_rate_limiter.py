@@ -0,0 +1,76 @@
+import time
+
+from app.utils.rate_limiter import AdaptiveRateLimiter, Bucket, parse_reset
+
+
+class TestBucket:
+    def test_takes_while_budget_left(self):
+        """
+        Запрос списывается, пока в бакете есть и запросы, и токены.
+        """
+        bucket = Bucket(requests=2, tokens=1000, updated_at=0)
+        assert bucket.take(0, 400, rpm=60, tpm=6000) == 0
+        assert bucket.take(0, 400, rpm=60, tpm=6000) == 0
+        assert bucket.take(0, 400, rpm=60, tpm=6000) > 0
+
+    def test_refills_over_time(self):
+        """
+        При rpm=60 за секунду бакет пополняется на один запрос.
+        """
+        bucket = Bucket(requests=0, tokens=6000, updated_at=0)
+        assert bucket.take(0, 1, rpm=60, tpm=6000) == 1
+        assert bucket.take(1, 1, rpm=60, tpm=6000) == 0
+
+    def test_token_budget(self):
+        """
+        Время ожидания считается по недостающим токенам.
+        """
+        bucket = Bucket(requests=10, tokens=0, updated_at=0)
+        assert bucket.take(0, 100, rpm=60, tpm=6000) == 1
+
+    def test_blocked_after_429(self):
+        """
+        После 429 бакет ждет до blocked_until.
+        """
+        bucket = Bucket(requests=10, tokens=6000, updated_at=0, blocked_until=5)
+        assert bucket.take(2, 1, rpm=60, tpm=6000) == 3
+
+    def test_reserve_batch(self):
+        """
+        Пачка ограничена и запросами, и токенами в бакете.
+        """
+        bucket = Bucket(requests=5, tokens=1000, updated_at=0)
+        assert bucket.reserve(0, 100, rpm=60, tpm=6000, count=10) == (5, 0.0)
+        bucket = Bucket(requests=5, tokens=250, updated_at=0)
+        assert bucket.reserve(0, 100, rpm=60, tpm=6000, count=10) == (2, 0.0)
+        assert bucket.reserve(0, 100, rpm=60, tpm=6000, count=10)[0] == 0
+
+
+class TestSharedReserve:
+    def test_spends_reserve_locally(self):
+        """
+        Взятое из общего бакета тратится без обращения к базе, пока не истечет.
+        """
+        limiter = AdaptiveRateLimiter(rpm=60, tpm=6000, min_concurrency=1,
+                                      max_concurrency=4, shared=True, batch=3)
+        limiter._reserved_requests, limiter._reserved_tokens = 2, 200
+        limiter._reserved_until = time.monotonic() + 1
+        assert limiter._take_reserved(100)
+        assert limiter._take_reserved(100)
+        assert not limiter._take_reserved(100)
+
+        limiter._reserved_requests, limiter._reserved_tokens = 2, 200
+        limiter._reserved_until = time.monotonic() - 1
+        assert not limiter._take_reserved(100)
+
+
+class TestParseReset:
+    def test_durations(self):
+        """
+        Форматы заголовков x-ratelimit-reset-* и Retry-After.
+        """
+        assert parse_reset("1s") == 1
+        assert parse_reset("6m0s") == 360
+        assert parse_reset("20ms") == 0.02
+        assert parse_reset("2") == 2
+        assert parse_reset(None) is None
@@ -0,0 +1,63 @@
+import pytest
+
+from app.schemas.ai import AICheckResult, AIGeneratedQuestion, AIGeneratedQuestions
+from app.utils.structured_output import _strict, parse_output
+
+
+class TestParseOutput:
+    def test_clean_json(self):
+        """
+        Ответ строго по схеме разбирается без починки.
+        """
+        result, repaired = parse_output('{"score": 2, "feedback": "Всё верно!"}', AICheckResult)
+        assert result.score == 2
+        assert not repaired
+
+    def test_fenced_json(self):
+        """
+        Ответ в ```json разбирается и помечается как починенный.
+        """
+        text = '```json\n{"questions": [{"description": "Что такое GIL?"}]}\n```'
+        result, repaired = parse_output(text, AIGeneratedQuestions)
+        assert result.questions[0].description == "Что такое GIL?"
+        assert repaired
+
+    def test_text_around_object(self):
+        """
+        Пояснения модели вокруг объекта отбрасываются.
+        """
+        text = 'Вот оценка: {"score": 1, "feedback": "Частично"} Удачи!'
+        result, repaired = parse_output(text, AICheckResult)
+        assert result.score == 1
+        assert repaired
+
+    def test_schema_violation(self):
+        """
+        Оценка вне 0..2 и лишние поля не проходят валидацию.
+        """
+        with pytest.raises(ValueError):
+            parse_output('{"score": 5, "feedback": "?"}', AICheckResult)
+        with pytest.raises(ValueError):
+            parse_output('{"score": 1, "feedback": "?", "extra": 1}', AICheckResult)
+
+
+class TestStrictSchema:
+    def test_nested_objects_require_all_fields(self):
+        """
+        В strict-схеме у вложенных объектов тоже все поля обязательны.
+        """
+        schema = _strict(AIGeneratedQuestions.model_json_schema())
+        nested = schema["$defs"]["AIGeneratedQuestion"]
+        assert nested["required"] == ["description"]
+        assert nested["additionalProperties"] is False
+
+    def test_unsupported_keywords_removed(self):
+        """
+        minLength и границы чисел убираются из strict-схемы, но проверяются при разборе.
+        """
+        schema = _strict(AIGeneratedQuestions.model_json_schema())
+        assert "minLength" not in schema["$defs"]["AIGeneratedQuestion"]["properties"]["description"]
+        score = _strict(AICheckResult.model_json_schema())["properties"]["score"]
+        assert "minimum" not in score and "maximum" not in score
+        with pytest.raises(ValueError):
+            parse_output('{"description": ""}', AIGeneratedQuestion)
@@ -0,0 +1,42 @@
+from uuid import uuid4
+
+from app.utils.question import is_answer_right
+
+
+class TestIsAnswerRight:
+    def test_single_choice_right(self):
+        """
+        Вопрос type 0: выбран один правильный вариант.
+        """
+        right = uuid4()
+        assert is_answer_right(0, {right}, {right})
+
+    def test_single_choice_several_selected(self):
+        """
+        Вопрос type 0: выбор нескольких вариантов не засчитывается,
+        даже если среди них есть правильный.
+        """
+        right, wrong = uuid4(), uuid4()
+        assert not is_answer_right(0, {right}, {right, wrong})
+
+    def test_single_choice_any_of_correct(self):
+        """
+        Вопрос type 0 с несколькими правильными вариантами: достаточно любого.
+        """
+        first, second = uuid4(), uuid4()
+        assert is_answer_right(0, {first, second}, {second})
+
+    def test_single_choice_empty(self):
+        """
+        Пустой ответ на вопрос type 0 неверен.
+        """
+        assert not is_answer_right(0, {uuid4()}, set())
+
+    def test_multiple_choice_exact(self):
+        """
+        Вопрос type 1: нужно выбрать в точности все правильные варианты.
+        """
+        first, second = uuid4(), uuid4()
+        assert is_answer_right(1, {first, second}, {first, second})
+        assert not is_answer_right(1, {first, second}, {first})
+        assert not is_answer_right(1, {first}, {first, uuid4()})
@@ -0,0 +1,18 @@
+from app.utils.grading_cache import grading_key, normalize_text
+
+
+class TestNormalizeText:
+    def test_spaces_case_and_sentence_end(self):
+        """
+        Пробелы, регистр и точка в конце не влияют на нормализованный текст.
+        """
+        assert normalize_text("  Не   знаю. ") == normalize_text("не знаю")
+        assert normalize_text("Индекс!?") == "индекс"
+
+    def test_sign_and_brackets_change_key(self):
+        """
+        Знак и скобки - часть ответа: ключи кэша разные.
+        """
+        assert grading_key("Чему равно x?", "-2") != grading_key("Чему равно x?", "2")
+        assert grading_key("Сложность поиска?", "O(1)") != grading_key("Сложность поиска?", "O(1")
+        assert grading_key("Цитата?", '"да"') != grading_key("Цитата?", "да")
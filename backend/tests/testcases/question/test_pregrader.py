@@ -0,0 +1,67 @@
+from app.config import get_settings
+from app.utils.pregrader import Pregrader, similarity
+
+
+settings = get_settings()
+
+
+def make_pregrader() -> Pregrader:
+    return Pregrader(min_length=3, copy_threshold=0.85, shingle_size=4)
+
+
+class TestPregrader:
+    def test_empty_answer(self):
+        """
+        Пустой ответ и «не знаю» оцениваются в 0 без модели.
+        """
+        pregrader = make_pregrader()
+        assert pregrader.grade("   ")["score"] == 0
+        assert pregrader.grade("Не знаю.")["score"] == 0
+        assert pregrader.stats()["empty"] == 2
+
+    def test_too_short_answer(self):
+        """
+        Ответ короче min_length оценивается в 0.
+        """
+        pregrader = make_pregrader()
+        assert pregrader.grade("да")["score"] == 0
+        assert pregrader.stats()["too_short"] == 1
+
+    def test_short_answer_goes_to_llm_by_default(self):
+        """
+        С настройками по умолчанию короткий ответ проверяет модель.
+        """
+        pregrader = Pregrader(min_length=settings.PREGRADE_MIN_LENGTH,
+                              copy_threshold=0.85, shingle_size=4)
+        for answer in ("42", "да", "O(1)"):
+            assert pregrader.grade(answer) is None
+        assert pregrader.stats()["too_short"] == 0
+
+    def test_copy_of_reference(self):
+        """
+        Почти дословная копия эталона засчитывается, регистр и пробелы не важны.
+        """
+        pregrader = make_pregrader()
+        reference = "Индекс ускоряет поиск строк, но замедляет вставку."
+        result = pregrader.grade("индекс  ускоряет поиск строк, но замедляет вставку", reference)
+        assert result["score"] == 2
+
+    def test_ambiguous_answer_goes_to_llm(self):
+        """
+        Содержательный ответ, не похожий на эталон, проверяет модель.
+        """
+        pregrader = make_pregrader()
+        reference = "Индекс ускоряет поиск строк, но замедляет вставку."
+        assert pregrader.grade("Индекс нужен, чтобы быстрее искать", reference) is None
+        assert pregrader.grade("Индекс нужен, чтобы быстрее искать") is None
+        stats = pregrader.stats()
+        assert stats["sent_to_llm"] == 2
+        assert stats["llm_calls_avoided"] == 0
+
+    def test_similarity(self):
+        """
+        Одинаковые тексты похожи на 1, совсем разные — на 0.
+        """
+        assert similarity("abcdef", "abcdef", 3) == 1.0
+        assert similarity("abcdef", "uvwxyz", 3) == 0.0
+        assert similarity("", "abcdef", 3) == 0.0